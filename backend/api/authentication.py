@@ -0,0 +1,128 @@
+'''Аутентификация по токену с кэшированием. '''
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram.cache_versions import bump_versions, get_versions
+
+
+class LRUCache:
+    """Ограниченный кэш процесса: при переполнении вытесняются
+    давно не использованные записи, каждая живет не дольше ttl секунд. """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+token_cache = LRUCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+
+def shared_key(key):
+    return f'auth_token:{key}'
+
+
+def version_key(key):
+    return f'token:{key}'
+
+
+def forget_tokens(keys):
+    """Сброс токенов keys: версия токена меняется, поэтому записи
+    с прежней версией не принимаются и кэшами других процессов. """
+    keys = list(keys)
+    if not keys:
+        return
+    bump_versions(*map(version_key, keys))
+    for key in keys:
+        token_cache.delete(key)
+    if settings.TOKEN_SHARED_CACHE_TIMEOUT:
+        cache.delete_many([shared_key(key) for key in keys])
+
+
+def forget_user_tokens(user_id):
+    """Сброс всех токенов пользователя при его изменении. """
+    forget_tokens(
+        Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+    )
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе на каждое чтение:
+    токен и пользователь берутся из LRU-кэша процесса, затем, если
+    TOKEN_SHARED_CACHE_TIMEOUT > 0, из общего кэша, и только потом
+    из базы. Запись принимается, только если версия токена в общем
+    кэше не изменилась с момента ее создания. Изменяющие
+    запросы всегда проверяют токен и читают пользователя из базы.
+    Каждый запрос получает свою копию пользователя.
+    """
+
+    use_cache = True
+
+    def authenticate(self, request):
+        self.use_cache = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        if self.use_cache:
+            item = self.get_cached(key)
+            if item is not None:
+                user, token, _ = item
+                return copy.copy(user), token
+        # Версия читается до базы: выход или изменение пользователя,
+        # зафиксированные между двумя чтениями, сменят ее, и запись
+        # с устаревшим пользователем не будет принята.
+        version, = get_versions([version_key(key)])
+        user, token = super().authenticate_credentials(key)
+        item = (user, token, version)
+        token_cache.set(key, item)
+        if settings.TOKEN_SHARED_CACHE_TIMEOUT:
+            cache.set(
+                shared_key(key), item, settings.TOKEN_SHARED_CACHE_TIMEOUT
+            )
+        return copy.copy(user), token
+
+    @staticmethod
+    def get_cached(key):
+        item = token_cache.get(key)
+        if item is None and settings.TOKEN_SHARED_CACHE_TIMEOUT:
+            item = cache.get(shared_key(key))
+            if item is not None:
+                token_cache.set(key, item)
+        if item is None:
+            return None
+        if get_versions([version_key(key)]) != [item[2]]:
+            token_cache.delete(key)
+            return None
+        return item
@@ -0,0 +1,109 @@
+'''Условные GET-запросы: версии данных и ETag. '''
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+
+from foodgram.cache_versions import get_versions
+
+
+class ConditionalGetMixin:
+    """Поддержка If-None-Match для list и retrieve. Если версии данных
+    не изменились, ответ 304 отдается без запроса к базе
+    и сериализации. Last-Modified не отдается: изменения в пределах
+    одной секунды он не различает.
+    """
+
+    def get_version_keys(self):
+        """Ключи версий данных, от которых зависит ответ,
+        или None, если ответ не кэшируется. """
+        return None
+
+    def get_cache_control(self):
+        """Параметры Cache-Control, которые учитывает и nginx. """
+        return {'public': True, 'max_age': settings.HTTP_CACHE_MAX_AGE}
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        keys = self.get_version_keys()
+        if keys is None:
+            return handler(request, *args, **kwargs)
+        versions = get_versions(keys)
+        etag = quote_etag(hashlib.md5(
+            repr(list(zip(keys, versions))).encode()
+        ).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        patch_cache_control(response, **self.get_cache_control())
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class PageCacheMixin:
+    """Кэш сериализованных страниц списка в анонимном представлении.
+    Ключ строится из нормализованных параметров запроса и версии
+    page_cache_version_key, поэтому при изменении данных старые
+    страницы просто перестают запрашиваться. В ключ входят и схема
+    с хостом: ссылки next и previous в странице абсолютные.
+    Запросы с параметрами вне page_cache_params не кэшируются.
+    Для авторизованных пользователей страница дополняется
+    их собственными отметками в personalize_page().
+    """
+
+    page_cache_params = ()
+    page_cache_version_key = None
+
+    def get_page_cache_key(self):
+        params = self.request.query_params
+        if not set(params) <= set(self.page_cache_params):
+            return None
+        normalized = sorted(
+            (name, sorted(set(params.getlist(name)))) for name in params
+        )
+        version, = get_versions([self.page_cache_version_key])
+        digest = hashlib.md5(repr(
+            (self.request.build_absolute_uri('/'), normalized)
+        ).encode()).hexdigest()
+        return f'page:{self.page_cache_version_key}:{version}:{digest}'
+
+    def get_anonymous_queryset(self):
+        raise NotImplementedError
+
+    def get_anonymous_page_data(self):
+        queryset = self.filter_queryset(self.get_anonymous_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data).data
+
+    def personalize_page(self, data):
+        return data
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_page_cache_key()
+        if key is None:
+            return super().list(request, *args, **kwargs)
+        page_cache = caches[settings.PAGE_CACHE_ALIAS]
+        data = page_cache.get(key)
+        if data is None:
+            data = self.get_anonymous_page_data()
+            page_cache.set(key, data, settings.PAGE_CACHE_TIMEOUT)
+        if request.user.is_authenticated:
+            data = self.personalize_page(data)
+        return Response(data)
@@ -0,0 +1,80 @@
+'''Потоковая выгрузка списка покупок в разных форматах. '''
+import csv
+import io
+import json
+from urllib.parse import quote
+
+from rest_framework.negotiation import DefaultContentNegotiation
+
+CHUNK_ROWS = 200
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """Параметр ?format= выбирает формат файла,
+    а не рендерер DRF, поэтому не участвует в согласовании. """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def _chunked(lines):
+    """Склеивание строк в блоки, чтобы не отдавать по строке за раз. """
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= CHUNK_ROWS:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _txt_lines(rows):
+    for name, unit, total in rows:
+        yield f'{name} - {total} ({unit})\n'
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('Ингредиент', 'Количество', 'Единицы измерения'))
+    yield '\ufeff' + buffer.getvalue()
+    for name, unit, total in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow((name, total, unit))
+        yield buffer.getvalue()
+
+
+def _json_lines(rows):
+    yield '['
+    separator = ''
+    for name, unit, total in rows:
+        item = json.dumps(
+            {'name': name, 'amount': total, 'measurement_unit': unit},
+            ensure_ascii=False
+        )
+        yield f'{separator}{item}'
+        separator = ','
+    yield ']'
+
+
+EXPORT_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', _txt_lines),
+    'csv': ('text/csv; charset=utf-8', _csv_lines),
+    'json': ('application/json; charset=utf-8', _json_lines),
+}
+
+
+def attachment_header(filename):
+    """Заголовок Content-Disposition для скачивания файла
+    с кириллическим именем (RFC 5987). """
+    return f"attachment; filename*=utf-8''{quote(filename)}"
+
+
+def export_shopping_list(rows, export_format):
+    """Генератор блоков файла списка покупок.
+    rows — итерируемый набор кортежей (название, единицы, количество).
+    """
+    _, render_lines = EXPORT_FORMATS[export_format]
+    return _chunked(render_lines(rows))
@@ -0,0 +1,107 @@
+'''Поля сериализаторов. '''
+import base64
+import binascii
+import re
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
+from rest_framework import serializers
+
+# Кратен 4, чтобы каждый кусок base64 декодировался отдельно.
+CHUNK_SIZE = 64 * 1024
+
+# Сколько декодированных байт пробовать читать заголовок изображения
+# до конца декодирования.
+HEADER_PROBE_SIZE = 1024 * 1024
+
+DATA_URI_PREFIX = re.compile(r'data:[\w/.+-]*;base64,')
+
+EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+
+
+class StreamingBase64ImageField(serializers.ImageField):
+    """Изображение строкой base64, с заголовком data:...;base64, или без.
+    Строка декодируется частями во временный файл, который остается
+    в памяти до FILE_UPLOAD_MAX_MEMORY_SIZE байт и дальше уходит
+    на диск. Размер файла проверяется по длине строки до декодирования,
+    ширина и высота — по заголовку изображения, как только он декодирован.
+    Пиксели при проверке не распаковываются.
+    """
+
+    default_error_messages = {
+        'invalid_base64': 'Изображение должно быть строкой base64.',
+        'invalid_image': 'Загрузите корректное изображение.',
+        'invalid_format': 'Поддерживаются форматы: {formats}.',
+        'too_large': 'Размер изображения не должен превышать {max_size} байт.',
+        'too_big': ('Ширина и высота изображения не должны превышать '
+                    '{max_dimension} пикселей.'),
+    }
+
+    def to_internal_value(self, data):
+        if data in ('', None):
+            return None
+        if not isinstance(data, str):
+            self.fail('invalid_base64')
+        prefix = DATA_URI_PREFIX.match(data)
+        start = prefix.end() if prefix else 0
+        max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        if (len(data) - start) // 4 * 3 > max_size:
+            self.fail('too_large', max_size=max_size)
+        file = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        image_format = None
+        for offset in range(start, len(data), CHUNK_SIZE):
+            try:
+                file.write(base64.b64decode(
+                    data[offset:offset + CHUNK_SIZE], validate=True
+                ))
+            except binascii.Error:
+                file.close()
+                self.fail('invalid_base64')
+            if image_format is None and file.tell() <= HEADER_PROBE_SIZE:
+                image_format = self.check_header(file, complete=False)
+        image_format = self.check_header(file, complete=True)
+        file.seek(0)
+        return File(file, name=f'{uuid.uuid4()}.{EXTENSIONS[image_format]}')
+
+    def check_header(self, file, complete):
+        """Проверка формата и размеров по заголовку изображения.
+        Возвращает формат или, для недокодированного до конца файла,
+        None, если заголовка пока не хватает. """
+        position = file.tell()
+        file.seek(0)
+        try:
+            with Image.open(file) as image:
+                if complete:
+                    image.verify()
+                image_format, size = image.format, image.size
+        except Image.DecompressionBombError:
+            file.close()
+            self.fail(
+                'too_big', max_dimension=settings.IMAGE_UPLOAD_MAX_DIMENSION
+            )
+        except Exception:
+            if not complete:
+                file.seek(position)
+                return None
+            file.close()
+            self.fail('invalid_image')
+        file.seek(position)
+        if image_format not in EXTENSIONS:
+            file.close()
+            self.fail('invalid_format', formats=', '.join(EXTENSIONS))
+        if max(size) > settings.IMAGE_UPLOAD_MAX_DIMENSION:
+            file.close()
+            self.fail(
+                'too_big', max_dimension=settings.IMAGE_UPLOAD_MAX_DIMENSION
+            )
+        return image_format
@@ -1,8 +1,65 @@
+from django import forms
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe
+from foodgram.cache_versions import get_versions
+from recipes import search
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
 from users.models import CustomUser
 
+RecipeTag = Recipe.tags.through
+
+RECIPE_ORDERINGS = {
+    'popular': ('-favorites_count', '-pub_date', '-id'),
+    'trending': ('-trending_score', '-pub_date', '-id'),
+    'cooking_time': ('cooking_time', '-pub_date', '-id'),
+}
+
+
+def tag_ids_by_slug():
+    """Словарь слаг → id тега. Хранится в кэше до изменения тегов. """
+    version, = get_versions(['tags'])
+    return cache.get_or_set(
+        f'tag_ids_by_slug:{version}',
+        lambda: dict(Tag.objects.values_list('slug', 'id')),
+        timeout=None
+    )
+
+
+class TagsFilter(filters.Filter):
+    """Фильтр рецептов по слагам тегов (?tags=a&tags=b).
+    Слаги сопоставляются с id по закэшированному словарю, а отбор идет
+    через EXISTS, поэтому строки рецептов не дублируются.
+    Режим задается параметром mode_param: any (любой из тегов,
+    по умолчанию) или all (все теги сразу).
+    """
+
+    field_class = forms.Field
+
+    def __init__(self, *args, mode_param='tags_mode', **kwargs):
+        kwargs.setdefault('widget', forms.SelectMultiple)
+        self.mode_param = mode_param
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        tag_ids = tag_ids_by_slug()
+        ids = {tag_ids[slug] for slug in value if slug in tag_ids}
+        mode = self.parent.form.cleaned_data.get(self.mode_param) or 'any'
+        if not ids or (mode == 'all' and len(ids) < len(set(value))):
+            return qs.none()
+        if mode == 'all':
+            for tag_id in ids:
+                qs = qs.filter(Exists(RecipeTag.objects.filter(
+                    recipe_id=OuterRef('pk'), tag_id=tag_id
+                )))
+            return qs
+        return qs.filter(Exists(RecipeTag.objects.filter(
+            recipe_id=OuterRef('pk'), tag_id__in=ids
+        )))
+
 
 class IngredientFilter(FilterSet):
     """Фильтр для поиска ингредиентов по названию. """
@@ -19,22 +76,56 @@ class RecipesFilter(FilterSet):
     избранному, автору, списку покупок и
     тегам"""
     author = filters.ModelChoiceFilter(queryset=CustomUser.objects.all())
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = TagsFilter()
+    tags_mode = filters.ChoiceFilter(
+        choices=(('any', 'Любой из тегов'), ('all', 'Все теги')),
+        method='filter_tags_mode'
+    )
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('popular', 'По числу добавлений в избранное'),
+            ('trending', 'По популярности за последнее время'),
+            ('cooking_time', 'По времени приготовления'),
+        ),
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
         fields = ["author", "tags"]
 
+    def filter_tags_mode(self, queryset, name, value):
+        """Режим учитывается в фильтре tags. """
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск с сортировкой по релевантности. """
+        return search.search(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        """Сортировка по полям с индексами (поле, -pub_date). """
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
+
     def filter_is_favorited(self, queryset, name, value):
-        if value:
-            return queryset.filter(favorite__user=self.request.user.id)
-        return queryset.objects.all()
+        return self.filter_user_list(queryset, Favorite, value)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        if value:
-            return queryset.filter(shopping_cart__user=self.request.user.id)
-        return queryset.objects.all()
+        return self.filter_user_list(queryset, ShoppingCart, value)
+
+    def filter_user_list(self, queryset, model, value):
+        """Рецепты из списка пользователя (value=1) или вне его (value=0).
+        Проверка идет подзапросом EXISTS по индексу (user, recipe),
+        без соединения таблиц. Для анонима список пуст, база не нужна.
+        """
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none() if value else queryset
+        in_list = Exists(model.objects.filter(
+            user_id=user.id, recipe_id=OuterRef('pk')
+        ))
+        return queryset.filter(in_list if value else ~in_list)
@@ -0,0 +1,64 @@
+import base64
+import io
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from api.serializers import RecipeCreateUpdateSerializer
+from recipes.models import Ingredient, Tag
+
+
+class Command(BaseCommand):
+    help = ('Замеряет проверку рецепта с длинным списком ингредиентов: '
+            'время и число запросов к базе. Данные не сохраняются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredients', type=int, default=500)
+        parser.add_argument('--runs', type=int, default=20)
+
+    def handle(self, *args, **options):
+        ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)
+            [:options['ingredients']]
+        )
+        tag_ids = list(Tag.objects.values_list('id', flat=True)[:1])
+        if not ingredient_ids or not tag_ids:
+            self.stderr.write('Нет ингредиентов или тегов')
+            return
+        payload = {
+            'name': 'benchmark',
+            'text': 'benchmark',
+            'cooking_time': 1,
+            'image': self.make_image(),
+            'tags': tag_ids,
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 1}
+                for ingredient_id in ingredient_ids
+            ],
+        }
+        timings = []
+        for _ in range(options['runs']):
+            serializer = RecipeCreateUpdateSerializer(data=payload)
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                serializer.is_valid(raise_exception=True)
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(
+            f'Ингредиентов: {len(ingredient_ids)}, '
+            f'запросов: {len(queries.captured_queries)}, '
+            f'медиана {statistics.median(timings):.1f} мс, '
+            f'максимум {max(timings):.1f} мс'
+        )
+
+    @staticmethod
+    def make_image():
+        buffer = io.BytesIO()
+        Image.new('RGB', (1, 1)).save(buffer, 'PNG')
+        return (
+            'data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode()
+        )
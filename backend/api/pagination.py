@@ -0,0 +1,163 @@
+'''Пагинация. '''
+import base64
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CommonPagination(PageNumberPagination):
+    """Пагинация."""
+    page_size = 6
+    page_size_query_param = 'limit'
+
+
+class RecipePagination(CommonPagination):
+    """Пагинация ленты рецептов.
+    По умолчанию — постраничная, как ждет фронтенд.
+    ?count=false — постраничная без COUNT(*): выбирается на одну
+    запись больше, чтобы понять, есть ли следующая страница.
+    ?cursor= — по ключу (pub_date, id) без OFFSET: каждая страница
+    читается по индексу pub_date с той же скоростью, что и первая.
+    """
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.mode = 'page'
+        if self.cursor_query_param in request.query_params:
+            if (
+                request.query_params.get('ordering')
+                or request.query_params.get('search')
+            ):
+                raise ValidationError({
+                    self.cursor_query_param:
+                    'Курсор доступен только для сортировки по дате.'
+                })
+            self.mode = 'cursor'
+            return self.paginate_by_cursor(queryset, request)
+        if request.query_params.get(self.count_query_param) == 'false':
+            self.mode = 'no_count'
+            return self.paginate_without_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.mode == 'page':
+            return super().get_paginated_response(data)
+        response = OrderedDict((
+            ('next', self.next_link),
+            ('previous', self.previous_link),
+            ('results', data),
+        ))
+        if self.mode == 'no_count':
+            response['count'] = None
+            response.move_to_end('count', last=False)
+        return Response(response)
+
+    def paginate_without_count(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            page_number = int(
+                request.query_params.get(self.page_query_param, 1)
+            )
+        except ValueError:
+            page_number = 0
+        if page_number < 1:
+            raise NotFound(self.invalid_page_message)
+        offset = (page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        url = request.build_absolute_uri()
+        self.next_link = None
+        if len(rows) > page_size:
+            self.next_link = replace_query_param(
+                url, self.page_query_param, page_number + 1
+            )
+        self.previous_link = None
+        if page_number == 2:
+            self.previous_link = remove_query_param(
+                url, self.page_query_param
+            )
+        elif page_number > 2:
+            self.previous_link = replace_query_param(
+                url, self.page_query_param, page_number - 1
+            )
+        return rows[:page_size]
+
+    def paginate_by_cursor(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param)
+        )
+        reverse = False
+        if position is not None:
+            reverse, pub_date, pk = position
+            if reverse:
+                queryset = queryset.filter(
+                    Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+                ).order_by('pub_date', 'pk')
+            else:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+                ).order_by('-pub_date', '-pk')
+        else:
+            queryset = queryset.order_by('-pub_date', '-pk')
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+        url = request.build_absolute_uri()
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else position is not None
+        self.next_link = None
+        if rows and has_next:
+            self.next_link = self.encode_cursor(url, False, rows[-1])
+        self.previous_link = None
+        if rows and has_previous:
+            self.previous_link = self.encode_cursor(url, True, rows[0])
+        return rows
+
+    def encode_cursor(self, url, reverse, recipe):
+        token = '|'.join((
+            'r' if reverse else 'f',
+            recipe.pub_date.isoformat(),
+            str(recipe.pk),
+        ))
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            base64.urlsafe_b64encode(token.encode()).decode()
+        )
+
+    def decode_cursor(self, cursor):
+        """(обратное направление, pub_date, id) или None для первой
+        страницы. """
+        if not cursor:
+            return None
+        try:
+            direction, pub_date, pk = base64.urlsafe_b64decode(
+                cursor.encode()
+            ).decode().split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if direction not in ('f', 'r') or pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return direction == 'r', pub_date, pk
+
+
+class FeedPagination(RecipePagination):
+    """Пагинация ленты подписок: всегда по ключу (pub_date, id). """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.mode = 'cursor'
+        return self.paginate_by_cursor(queryset, request)
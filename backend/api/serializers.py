@@ -1,15 +1,21 @@
 '''Сериализатор для приложений recipes и users. '''
 import re
 
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
 from rest_framework.serializers import SerializerMethodField, ValidationError
 from rest_framework.validators import UniqueTogetherValidator
 
+from api.fields import StreamingBase64ImageField
+from api.user_state import get_user_state
+from recipes import images, search
+from recipes.cookable_index import cookable_index
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag, lock_recipes)
 from users.models import CustomUser, Follow
 
 
@@ -42,13 +48,19 @@ class CustomUserSerializer(UserCreateSerializer):
         return username
 
 
+def get_followed_author_ids(request):
+    """Id авторов, на которых подписан текущий пользователь.
+    Читаются одним запросом из отметок пользователя (get_user_state),
+    поэтому общие для всех сериализаторов в рамках запроса. """
+    return get_user_state(request).followed_authors
+
+
 class SubscriptionMixin:
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=request.user, author=obj.id).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.id in get_followed_author_ids(self.context.get('request'))
 
 
 class CustomUserGetSerializer(UserSerializer, SubscriptionMixin):
@@ -105,6 +117,31 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class RenditionImageField(serializers.ImageField):
+    """Ссылка на уменьшенную копию изображения рецепта, а пока копии
+    не готовы — на оригинал. Размер копии можно переопределить
+    ключом image_rendition в контексте сериализатора. """
+
+    def __init__(self, rendition, **kwargs):
+        self.rendition = rendition
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = value.url
+        if value.instance.image_processed:
+            url = default_storage.url(images.rendition_name(
+                value.name,
+                self.context.get('image_rendition', self.rendition)
+            ))
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор ингредиента в рецепте."""
 
@@ -123,7 +160,30 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'amount', 'measurement_unit')
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeIngredientWriteSerializer(serializers.Serializer):
+    """Ингредиент в рецепте при создании и редактировании.
+    id проверяется сразу для всего списка в validate_ingredients. """
+
+    id = serializers.IntegerField()
+    amount = serializers.IntegerField(required=True, min_value=1)
+
+
+class SparseFieldsMixin:
+    """Только поля из context['fields'] (параметр ?fields=), если он
+    задан. Вложенные сериализаторы не затрагиваются. """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        if requested is None:
+            return fields
+        return {
+            name: field for name, field in fields.items()
+            if name in requested
+        }
+
+
+class RecipeReadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Получение рецепта."""
 
     author = CustomUserSerializer(read_only=True)
@@ -132,24 +192,23 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         many=True
     )
     tags = TagSerializer(read_only=True, many=True)
+    image = RenditionImageField('full')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     def get_is_favorited(self, obj):
         """Получение избранных рецептов."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        user = request.user
-        return Favorite.objects.filter(recipe=obj, user=user).exists()
+        return obj.id in get_user_state(request).favorites
 
     def get_is_in_shopping_cart(self, obj):
         """Получение списка покупок."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        user = request.user
-        return ShoppingCart.objects.filter(recipe=obj, user=user).exists()
+        return obj.id in get_user_state(request).shopping_cart
 
     class Meta:
         model = Recipe
@@ -167,14 +226,22 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeListSerializer(RecipeReadSerializer):
+    """Рецепт в ленте: без описания и ингредиентов. """
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = tuple(
+            name for name in RecipeReadSerializer.Meta.fields
+            if name not in ('text', 'ingredients')
+        )
+
+
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """Сериализатор создания/изменения/удаления своего рецепта. """
 
-    ingredients = RecipeIngredientSerializer(many=True)
-    image = Base64ImageField()
-    tags = serializers.SlugRelatedField(
-        many=True, queryset=Tag.objects.all(), slug_field='id'
-    )
+    ingredients = RecipeIngredientWriteSerializer(many=True)
+    image = StreamingBase64ImageField()
+    tags = serializers.ListField(child=serializers.IntegerField())
     author = CustomUserSerializer(read_only=True)
     cooking_time = serializers.IntegerField(min_value=1)
 
@@ -191,6 +258,41 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             'cooking_time',
         )
 
+    def validate_ingredients(self, ingredients):
+        """Проверка ингредиентов одним запросом к базе: ошибки
+        возвращаются списком, по элементу на каждый ингредиент. """
+        found = Ingredient.objects.in_bulk(
+            {item['id'] for item in ingredients}
+        )
+        errors = []
+        seen = set()
+        for item in ingredients:
+            if item['id'] not in found:
+                errors.append({'id': [
+                    f'Ингредиент с id={item["id"]} не существует.'
+                ]})
+            elif item['id'] in seen:
+                errors.append({'id': ['Этот ингредиент уже добавлен']})
+            else:
+                errors.append({})
+            seen.add(item['id'])
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return [
+            {'ingredient': found[item['id']], 'amount': item['amount']}
+            for item in ingredients
+        ]
+
+    def validate_tags(self, tag_ids):
+        """Проверка тегов одним запросом к базе. """
+        found = Tag.objects.in_bulk(set(tag_ids))
+        unknown = [tag_id for tag_id in tag_ids if tag_id not in found]
+        if unknown:
+            raise serializers.ValidationError(
+                f'Теги не существуют: {", ".join(map(str, unknown))}.'
+            )
+        return [found[tag_id] for tag_id in tag_ids]
+
     def validate(self, data):
         """Метод валидации данных перед созданием рецепта."""
         image = data.get('image')
@@ -204,18 +306,6 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 {'Добавьте хотя бы один ингредиент'}
             )
-        ingredients_result = []
-        for ingredient in ingredients:
-            if ingredient in ingredients_result:
-                raise serializers.ValidationError(
-                    'Этот ингредиент уже добавлен'
-                )
-            if ingredient['amount'] < 1:
-                raise serializers.ValidationError(
-                    {'amount': 'Маловато будет!'}
-                )
-            ingredients_result.append(ingredient)
-        data['ingredients'] = ingredients_result
 
         tags = data.get('tags')
         if not tags:
@@ -239,6 +329,53 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             ) for ingredient_item in ingredients
         ])
 
+    @staticmethod
+    def update_cookable_index(recipe, ingredients):
+        """Обновление индекса подбора рецептов после фиксации транзакции. """
+        ingredient_ids = [item['ingredient'].id for item in ingredients]
+        transaction.on_commit(
+            lambda: cookable_index.update_recipe(recipe.id, ingredient_ids)
+        )
+
+    @staticmethod
+    def sync_ingredients(recipe, ingredients):
+        """Приведение ингредиентов рецепта к новому составу:
+        добавляются новые, обновляются изменившиеся количества,
+        удаляются убранные — неизменные строки не трогаются.
+        Возвращает изменения количеств {ingredient_id: разница}. """
+        existing = {
+            item.ingredient_id: item
+            for item in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        amounts = {
+            item['ingredient'].id: item['amount'] for item in ingredients
+        }
+        deltas = {}
+        to_create, to_update = [], []
+        for ingredient_id, amount in amounts.items():
+            item = existing.get(ingredient_id)
+            if item is None:
+                to_create.append(RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                ))
+                deltas[ingredient_id] = amount
+            elif item.amount != amount:
+                deltas[ingredient_id] = amount - item.amount
+                item.amount = amount
+                to_update.append(item)
+        to_delete = []
+        for ingredient_id in existing.keys() - amounts.keys():
+            to_delete.append(existing[ingredient_id].pk)
+            deltas[ingredient_id] = -existing[ingredient_id].amount
+        if to_delete:
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        return deltas
+
+    @transaction.atomic
     def create(self, validated_data):
         """Создание рецепта. """
         ingredients = validated_data.pop('ingredients')
@@ -248,35 +385,61 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         self.create_ingredients_in_recipe(
             ingredients, recipe
         )
+        search.index_recipes([recipe.id])
+        self.update_cookable_index(recipe, ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Редактирование рецепта. """
+        """Редактирование рецепта. Теги и ингредиенты обновляются
+        по разнице со старым составом. Рецепт блокируется до чтения
+        состава и корзин: параллельное добавление в корзину дождется
+        изменения и прочитает новый состав. """
+        lock_recipes([instance.pk])
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        instance.tags.clear()
         instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_ingredients_in_recipe(
-            recipe=instance,
-            ingredients=ingredients,
-        )
-        instance = super().update(instance, validated_data)
+        deltas = self.sync_ingredients(instance, ingredients)
+        if deltas:
+            ShoppingListItem.objects.apply_delta(
+                instance.shopping_cart.values_list('user_id', flat=True),
+                deltas
+            )
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=list(validated_data))
+        search.index_recipes([instance.id])
+        self.update_cookable_index(instance, ingredients)
         return instance
 
     def to_representation(self, instance):
-        """Определяет сериализатор, используемый для чтения. """
+        """Определяет сериализатор, используемый для чтения.
+        Рецепт перечитывается с автором, тегами и ингредиентами,
+        чтобы ответ строился фиксированным числом запросов. """
         return RecipeReadSerializer(
-            instance,
+            Recipe.objects.with_related().get(pk=instance.pk),
             context=self.context
         ).data
 
 
+class CookableRecipeSerializer(RecipeReadSerializer):
+    """Рецепт в подборе по имеющимся ингредиентам:
+    missing — сколько ингредиентов рецепта не хватает. """
+
+    missing = serializers.SerializerMethodField()
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + ('missing',)
+
+    def get_missing(self, obj):
+        return self.context['missing'][obj.id]
+
+
 class UsersRecipeSerializer(serializers.ModelSerializer):
     """Cериализатор чтения рецептов
     для подписок, избранного и корзины. """
 
-    image = Base64ImageField()
+    image = RenditionImageField('thumbnail')
 
     class Meta:
         model = Recipe
@@ -284,12 +447,36 @@ class UsersRecipeSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для массового добавления в избранное
+    или список покупок и удаления из них. Рецепты проверяются
+    одним запросом, повторы отбрасываются. """
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT,
+    )
+
+    def validate_recipes(self, recipe_ids):
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        found = Recipe.objects.only(
+            'id', 'name', 'image', 'image_processed', 'cooking_time'
+        ).in_bulk(recipe_ids)
+        missing = [pk for pk in recipe_ids if pk not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'Рецепты не найдены: {", ".join(map(str, missing))}.'
+            )
+        return [found[pk] for pk in recipe_ids]
+
+
 class FollowReadSerializer(serializers.ModelSerializer, SubscriptionMixin):
     """Сериализатор просмотра подписок текущего пользователя. """
 
     is_subscribed = SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = CustomUser
@@ -319,10 +506,6 @@ class FollowReadSerializer(serializers.ModelSerializer, SubscriptionMixin):
         )
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        """Получение количества рецептов автора"""
-        return obj.recipes.count()
-
 
 class FollowSerializer(serializers.ModelSerializer):
     """Сериализатор создания/удаления подписки."""
@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import forget_tokens, forget_user_tokens
+from foodgram.cache_versions import bump_versions_on_commit
+from recipes import feed
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import CustomUser, Follow
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(sender, **kwargs):
+    bump_versions_on_commit('tags', 'recipe_list')
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    bump_versions_on_commit('ingredients', 'recipe_list')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    bump_versions_on_commit(f'recipe:{instance.pk}', 'recipe_list')
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: feed.push_recipe(instance))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    author_id = instance.author_id
+    transaction.on_commit(lambda: feed.forget_author(author_id))
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: feed.forget_user(user_id))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    bump_versions_on_commit(f'recipe:{instance.recipe_id}', 'recipe_list')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_versions_on_commit(f'recipe:{instance.pk}', 'recipe_list')
+    elif pk_set:
+        bump_versions_on_commit(
+            *(f'recipe:{pk}' for pk in pk_set), 'recipe_list'
+        )
+
+
+# Поля пользователя, которые выводятся в карточках рецептов.
+AUTHOR_CARD_FIELDS = {'username', 'email', 'first_name', 'last_name'}
+
+
+@receiver((post_save, post_delete), sender=CustomUser)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    keys = [f'user:{instance.pk}']
+    if (
+        update_fields is None or AUTHOR_CARD_FIELDS & set(update_fields)
+    ) and Recipe.objects.filter(author_id=instance.pk).exists():
+        keys.append('recipe_list')
+    bump_versions_on_commit(*keys)
+    user_id = instance.pk
+    transaction.on_commit(lambda: forget_user_tokens(user_id))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    key = instance.key
+    transaction.on_commit(lambda: forget_tokens([key]))
@@ -17,6 +17,18 @@ router_v1.register(r'subscriptions', CustomUserViewSet,
 urlpatterns = [
     url(r'^auth/', include('djoser.urls')),
     url(r'^auth/', include('djoser.urls.authtoken')),
+    path(
+        'recipes/favorite/',
+        FavoriteViewSet.as_view({'post': 'bulk_add', 'delete': 'bulk_remove'}),
+        name='favorite-bulk',
+    ),
+    path(
+        'recipes/shopping_cart/',
+        ShoppingCartViewSet.as_view(
+            {'post': 'bulk_add', 'delete': 'bulk_remove'}
+        ),
+        name='shopping_cart-bulk',
+    ),
     url(r'', include(router_v1.urls)),
     path(
         'recipes/<int:id>/favorite/',
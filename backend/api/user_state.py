@@ -0,0 +1,90 @@
+'''Отметки текущего пользователя: избранное, список покупок, подписки. '''
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follow
+
+# Набор: (модель, поле пользователя, поле отмеченного объекта).
+SOURCES = {
+    'favorites': (Favorite, 'user_id', 'recipe_id'),
+    'shopping_cart': (ShoppingCart, 'user_id', 'recipe_id'),
+    'followed_authors': (Follow, 'user_id', 'author_id'),
+}
+
+
+def cache_key(user_id, name):
+    return f'user_state:{user_id}:{name}'
+
+
+class UserState:
+    """Id избранных рецептов, рецептов в списке покупок и авторов
+    из подписок пользователя. Каждый набор читается одним запросом
+    при первом обращении и хранится до конца запроса к API,
+    а при USER_STATE_CACHE_TIMEOUT > 0 — еще и в общем кэше,
+    пока не будет сброшен invalidate_user_state().
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._sets = {}
+
+    def get(self, name):
+        if self.user_id is None:
+            return frozenset()
+        if name not in self._sets:
+            self._sets[name] = self._load(name)
+        return self._sets[name]
+
+    def _load(self, name):
+        timeout = settings.USER_STATE_CACHE_TIMEOUT
+        key = cache_key(self.user_id, name)
+        if timeout:
+            ids = cache.get(key)
+            if ids is not None:
+                return ids
+        model, user_field, field = SOURCES[name]
+        ids = frozenset(model.objects.filter(
+            **{user_field: self.user_id}
+        ).values_list(field, flat=True))
+        if timeout:
+            cache.set(key, ids, timeout)
+        return ids
+
+    @property
+    def favorites(self):
+        return self.get('favorites')
+
+    @property
+    def shopping_cart(self):
+        return self.get('shopping_cart')
+
+    @property
+    def followed_authors(self):
+        return self.get('followed_authors')
+
+
+def get_user_state(request):
+    """Отметки пользователя запроса, общие для всех сериализаторов
+    в его рамках. """
+    if request is None:
+        return UserState(None)
+    state = getattr(request, '_user_state', None)
+    if state is None:
+        state = UserState(
+            None if request.user.is_anonymous else request.user.id
+        )
+        request._user_state = state
+    return state
+
+
+def invalidate_user_state(request, *names):
+    """Сброс наборов names после их изменения в запросе request:
+    в самом запросе сразу, в общем кэше — после фиксации транзакции. """
+    state = get_user_state(request)
+    for name in names:
+        state._sets.pop(name, None)
+    if settings.USER_STATE_CACHE_TIMEOUT and state.user_id is not None:
+        keys = [cache_key(state.user_id, name) for name in names]
+        transaction.on_commit(lambda: cache.delete_many(keys))
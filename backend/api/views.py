@@ -1,36 +1,43 @@
-from django.db.models import Sum
-from django.http import FileResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, F, Prefetch, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import (AllowAny,
-                                        IsAuthenticated,
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from api.caching import ConditionalGetMixin, PageCacheMixin
+from api.exporters import (EXPORT_FORMATS, ExportContentNegotiation,
+                           attachment_header, export_shopping_list)
 from api.filters import IngredientFilter, RecipesFilter
+from api.pagination import CommonPagination, FeedPagination, RecipePagination
 from api.permissions import IsOwnerOrReadOnly
-from api.serializers import (CustomUserGetSerializer, CustomUserSerializer,
-                             FavoriteSerializer, FollowReadSerializer,
-                             FollowSerializer, IngredientSerializer,
-                             RecipeCreateUpdateSerializer,
-                             RecipeReadSerializer, ShoppingCartSerializer,
-                             TagSerializer)
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from api.serializers import (CookableRecipeSerializer, CustomUserGetSerializer,
+                             CustomUserSerializer, FavoriteSerializer,
+                             FollowReadSerializer, FollowSerializer,
+                             IngredientSerializer,
+                             RecipeCreateUpdateSerializer, RecipeIdsSerializer,
+                             RecipeListSerializer, RecipeReadSerializer,
+                             ShoppingCartSerializer, TagSerializer,
+                             UsersRecipeSerializer)
+from api.user_state import get_user_state, invalidate_user_state
+from foodgram.cache_versions import bump_versions_on_commit
+from recipes import feed, search
+from recipes.cookable_index import cookable_index
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingListItem, Tag, lock_recipes, lock_users,
+                            recipe_amounts)
 from users.models import CustomUser, Follow
 
 
-class CommonPagination(PageNumberPagination):
-    """Пагинация."""
-    page_size = 6
-    page_size_query_param = 'limit'
-
-
 class CustomUserViewSet(UserViewSet):
     """Api для работы с пользователями.
     """
@@ -72,10 +79,21 @@ class CustomUserViewSet(UserViewSet):
                 context={'request': request}
             )
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                CustomUser.objects.filter(pk=author.pk).update(
+                    followers_count=F('followers_count') + 1
+                )
+                invalidate_user_state(request, 'followed_authors')
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if follow.exists():
-            follow.delete()
+        with transaction.atomic():
+            deleted, _ = follow.delete()
+            if deleted:
+                CustomUser.objects.filter(pk=author.pk).update(
+                    followers_count=F('followers_count') - 1
+                )
+                invalidate_user_state(request, 'followed_authors')
+        if deleted:
             return Response(
                 f'Подписка на {author.username} отменена',
                 status=status.HTTP_204_NO_CONTENT
@@ -95,9 +113,20 @@ class CustomUserViewSet(UserViewSet):
         Обработка запросов к '/api/users/subscriptions/
         """
         user = request.user
+        recipes_limit = request.query_params.get('recipes_limit')
+        recipes = Recipe.objects.all()
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes.filter(
+                author__author__user=user
+            ).latest_per_author(int(recipes_limit))
         queryset = (
             CustomUser.objects
             .filter(author__user=user)
+            .annotate(
+                is_subscribed=Value(True, output_field=BooleanField()),
+            )
+            .prefetch_related(Prefetch('recipes', queryset=recipes))
+            .order_by('id')
         )
         pages = self.paginate_queryset(queryset)
         serializer = FollowReadSerializer(
@@ -108,55 +137,274 @@ class CustomUserViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, PageCacheMixin, ModelViewSet):
     """Представление списка рецептов/отдельного рецепта,
     создания, редактирования и удаления своего рецепта.
     Обрабатывает запросы к /api/recipes/ и /api/recipes/{id}/"""
 
     queryset = Recipe.objects.all()
     permission_classes = [IsOwnerOrReadOnly, IsAuthenticatedOrReadOnly]
-    pagination_class = CommonPagination
+    pagination_class = RecipePagination
     filterset_class = RecipesFilter
+    page_cache_params = (
+        'tags', 'tags_mode', 'author', 'ordering', 'page', 'limit',
+        'cursor', 'count', 'fields'
+    )
+    page_cache_version_key = 'recipe_list'
+
+    def get_anonymous_queryset(self):
+        return Recipe.objects.for_read(None, self.get_serialized_fields())
+
+    def get_requested_fields(self):
+        """Поля из ?fields=id,name,... или None, если параметр не задан. """
+        if 'fields' not in self.request.query_params:
+            return None
+        fields = {
+            name.strip()
+            for name in self.request.query_params['fields'].split(',')
+            if name.strip()
+        }
+        unknown = fields - set(RecipeReadSerializer.Meta.fields)
+        if unknown:
+            raise ValidationError({
+                'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}.'
+            })
+        return fields
+
+    def get_serialized_fields(self):
+        """Запрошенные поля и id: по нему отметки пользователя
+        накладываются на закэшированную страницу. Если id не запрошен,
+        он убирается из ответа в finalize_response(). """
+        fields = self.get_requested_fields()
+        return None if fields is None else fields | {'id'}
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (
+            self.action in ('list', 'retrieve', 'feed')
+            and response.status_code == status.HTTP_200_OK
+        ):
+            fields = self.get_requested_fields()
+            if fields is not None and 'id' not in fields:
+                response.data = self.without_id(response.data)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    @staticmethod
+    def without_id(data):
+        if 'results' not in data:
+            return {key: value for key, value in data.items() if key != 'id'}
+        return {
+            **data,
+            'results': [
+                {key: value for key, value in recipe.items() if key != 'id'}
+                for recipe in data['results']
+            ],
+        }
+
+    def personalize_page(self, data):
+        """Отметки «в избранном» и «в списке покупок» текущего
+        пользователя поверх закэшированной анонимной страницы. """
+        state = get_user_state(self.request)
+        favorited, in_shopping_cart = state.favorites, state.shopping_cart
+        return {
+            **data,
+            'results': [
+                self.mark_recipe(recipe, favorited, in_shopping_cart)
+                for recipe in data['results']
+            ],
+        }
+
+    @staticmethod
+    def mark_recipe(recipe, favorited, in_shopping_cart):
+        recipe = dict(recipe)
+        if 'is_favorited' in recipe:
+            recipe['is_favorited'] = recipe['id'] in favorited
+        if 'is_in_shopping_cart' in recipe:
+            recipe['is_in_shopping_cart'] = recipe['id'] in in_shopping_cart
+        return recipe
+
+    def get_version_keys(self):
+        if self.action != 'retrieve':
+            return None
+        author_id = Recipe.objects.filter(
+            pk=self.kwargs.get('pk')
+        ).values_list('author_id', flat=True).first()
+        if author_id is None:
+            return None
+        keys = [f'recipe:{self.kwargs["pk"]}', f'user:{author_id}',
+                'tags', 'ingredients']
+        if self.request.user.is_authenticated:
+            keys.append(f'user_state:{self.request.user.id}')
+        return keys
+
+    def get_cache_control(self):
+        if self.request.user.is_authenticated:
+            return {'private': True, 'no_cache': True}
+        return {'public': True, 'max_age': 0, 'must_revalidate': True}
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            return Recipe.objects.for_read(
+                self.request.user.id, self.get_serialized_fields()
+            )
+        return super().get_queryset()
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update', 'delete']:
             return RecipeCreateUpdateSerializer
+        fields = self.get_serialized_fields()
+        if (
+            self.action in ('list', 'feed') and fields is not None
+            and fields <= set(RecipeListSerializer.Meta.fields)
+        ):
+            return RecipeListSerializer
         return RecipeReadSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'feed', 'cookable'):
+            context['image_rendition'] = 'card'
+        if self.action in ('list', 'retrieve', 'feed'):
+            context['fields'] = self.get_serialized_fields()
+        return context
+
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        CustomUser.objects.filter(pk=self.request.user.pk).update(
+            recipes_count=F('recipes_count') + 1
+        )
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """Удаление рецепта с вычитанием его ингредиентов
+        из списков покупок пользователей, добавивших его в корзину.
+        Рецепт блокируется до чтения корзин: параллельное добавление
+        в корзину дождется удаления. """
+        lock_recipes([instance.id])
+        amounts = recipe_amounts(instance.id)
+        ShoppingListItem.objects.apply_delta(
+            instance.shopping_cart.values_list('user_id', flat=True),
+            {key: -value for key, value in amounts.items()}
+        )
+        search.remove_recipes([instance.id])
+        recipe_id = instance.id
+        instance.delete()
+        transaction.on_commit(
+            lambda: cookable_index.remove_recipe(recipe_id)
+        )
+        CustomUser.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') - 1
+        )
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        pagination_class=FeedPagination,
+    )
+    def feed(self, request):
+        """Рецепты авторов из подписок текущего пользователя,
+        от новых к старым, с пагинацией по курсору.
+        Обработка запросов к '/api/recipes/feed/'.
+        Первая страница выбирается по id из закэшированного начала ленты.
+        """
+        queryset = Recipe.objects.for_read(
+            request.user.id, self.get_serialized_fields()
+        )
+        page_size = self.paginator.get_page_size(request)
+        if (
+            not request.query_params.get('cursor')
+            and page_size < settings.FEED_HEAD_SIZE
+        ):
+            head = feed.get_head(request.user.id)
+            queryset = queryset.filter(pk__in=head[:page_size + 1])
+        else:
+            queryset = queryset.filter(
+                author_id__in=feed.followed_authors(request.user.id)
+            )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=[AllowAny],
+        pagination_class=CommonPagination,
+    )
+    def cookable(self, request):
+        """Подбор рецептов по имеющимся ингредиентам
+        (?ingredients=1&ingredients=2 или ?ingredients=1,2):
+        сначала те, что можно приготовить целиком, затем те,
+        где не хватает одного ингредиента, и т.д.
+        ?max_missing= ограничивает число недостающих.
+        """
+        try:
+            ingredient_ids = {
+                int(value)
+                for param in request.query_params.getlist('ingredients')
+                for value in param.split(',') if value
+            }
+            max_missing = request.query_params.get('max_missing')
+            max_missing = int(max_missing) if max_missing else None
+        except ValueError:
+            return Response(
+                'Идентификаторы и max_missing должны быть числами',
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not ingredient_ids:
+            return Response(
+                'Укажите хотя бы один ингредиент',
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ranked = cookable_index.rank(ingredient_ids, max_missing)
+        page = self.paginate_queryset(ranked)
+        recipes = Recipe.objects.for_read(request.user.id).in_bulk(
+            [recipe_id for recipe_id, _ in page]
+        )
+        serializer = CookableRecipeSerializer(
+            [recipes[recipe_id] for recipe_id, _ in page
+             if recipe_id in recipes],
+            many=True,
+            context={**self.get_serializer_context(), 'missing': dict(page)}
+        )
+        return self.get_paginated_response(serializer.data)
 
     @action(
         methods=["GET"],
         detail=False,
-        permission_classes=[IsAuthenticated]
+        permission_classes=[IsAuthenticated],
+        content_negotiation_class=ExportContentNegotiation,
     )
     def download_shopping_cart(self, request):
-        """Подсчет ингредиентов и скачивание списка покупок. """
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_cart__user=request.user
+        """Подсчет ингредиентов и потоковое скачивание списка покупок.
+        Формат файла задается параметром ?format=txt|csv|json.
+        """
+        export_format = request.query_params.get('format', 'txt')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'format': f'Доступные форматы: {", ".join(EXPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
         ).values_list(
             'ingredient__name',
             'ingredient__measurement_unit',
-        ).annotate(total=Sum('amount'))
-        shopping_result = []
-        for ingredient in ingredients:
-            shopping_result.append(
-                f'{ingredient[0]} - '
-                f'{ingredient[2]} '
-                f'({ingredient[1]})'
-            )
-        shopping_itog = '\n'.join(shopping_result)
-        response = FileResponse(
-            shopping_itog,
-            content_type='text/plain',
-            as_attachment=True,
-            filename='Список покупок.txt'
+            'amount',
+        ).order_by('ingredient__name')
+        content_type, _ = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            export_shopping_list(ingredients.iterator(), export_format),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = attachment_header(
+            f'Список покупок.{export_format}'
         )
         return response
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     """ Представление ингредиентов. """
 
     filterset_class = IngredientFilter
@@ -166,40 +414,154 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
 
+    def get_version_keys(self):
+        return ['ingredients']
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.list_from_index, request, *args, **kwargs
+        )
+
+    def list_from_index(self, request, *args, **kwargs):
+        """Список ингредиентов и автодополнение по ?name=
+        из индекса в памяти, без обращения к базе данных. """
+        name = request.query_params.get('name')
+        if not name:
+            return Response(ingredient_index.all())
+        return Response(ingredient_index.search(
+            name, limit=settings.INGREDIENT_SEARCH_LIMIT
+        ))
+
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     """ Представление тегов. """
 
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
     pagination_class = None
 
+    def get_version_keys(self):
+        return ['tags']
+
 
 class BaseItemFavoriteShopingCartViewSet(ModelViewSet):
     model = None
     serializer_class = None
     pagination_class = CommonPagination
+    counter_field = None
+    user_state_name = None
 
+    def change_counter(self, recipe_ids, delta):
+        """Изменение счетчика добавлений рецептов в список. """
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            **{self.counter_field: F(self.counter_field) + delta}
+        )
+
+    def items_added(self, user, recipe_ids):
+        """Действие после добавления рецептов в список. """
+
+    def items_removed(self, user, recipe_ids):
+        """Действие после удаления рецептов из списка. """
+
+    @staticmethod
+    def lock(user, recipe_ids):
+        """Блокировка рецептов и строки пользователя до конца транзакции:
+        изменения его списка выполняются по очереди, и счетчики
+        считаются по точно известным добавленным и удаленным рецептам.
+        Рецепты блокируются первыми, как при их изменении и удалении. """
+        lock_recipes(recipe_ids)
+        lock_users([user.pk])
+
+    def listed_ids(self, user, recipe_ids):
+        return set(self.model.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True))
+
+    @transaction.atomic
     def create(self, request, **kwargs):
         """Создание списка рецептов . """
         item_id = kwargs.get('id')
         item = get_object_or_404(Recipe, id=item_id)
         user = request.user
+        self.lock(user, [item.id])
+        if self.model.objects.filter(user=user, recipe=item).exists():
+            return Response(status=status.HTTP_400_BAD_REQUEST)
         new_item = self.model(user=user, recipe=item)
         new_item.save()
+        self.change_counter([item.id], 1)
+        self.items_added(user, [item.id])
+        self.items_changed(request)
         serializer = self.serializer_class(
             new_item, context={'request': request}
         )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, **kwargs):
         """Удаление рецепта из списка . """
         item_id = kwargs['id']
         user = request.user
         item = get_object_or_404(Recipe, id=item_id)
+        self.lock(user, [item.id])
         if not self.model.objects.filter(user=user, recipe=item).exists():
             return Response(status=status.HTTP_400_BAD_REQUEST)
         self.model.objects.get(user=user, recipe=item).delete()
+        self.change_counter([item.id], -1)
+        self.items_removed(user, [item.id])
+        self.items_changed(request)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def get_bulk_recipes(self, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['recipes']
+
+    def items_changed(self, request):
+        """Сброс состояния пользователя после изменения его списка.
+        Единственное место, где меняется версия user_state: у моделей
+        списков нет обработчиков сигналов, и удаление нескольких строк
+        выполняется одним DELETE. """
+        bump_versions_on_commit(f'user_state:{request.user.id}')
+        invalidate_user_state(request, self.user_state_name)
+
+    @transaction.atomic
+    def bulk_add(self, request):
+        """Добавление нескольких рецептов в список:
+        {"recipes": [id, ...]}. Уже добавленные пропускаются. """
+        recipes = self.get_bulk_recipes(request)
+        user = request.user
+        recipe_ids = [recipe.id for recipe in recipes]
+        self.lock(user, recipe_ids)
+        new_ids = set(recipe_ids) - self.listed_ids(user, recipe_ids)
+        if new_ids:
+            self.model.objects.bulk_create(
+                [self.model(user=user, recipe_id=pk) for pk in new_ids],
+                ignore_conflicts=True
+            )
+            self.change_counter(new_ids, 1)
+            self.items_added(user, new_ids)
+            self.items_changed(request)
+        serializer = UsersRecipeSerializer(
+            recipes, many=True, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @transaction.atomic
+    def bulk_remove(self, request):
+        """Удаление нескольких рецептов из списка:
+        {"recipes": [id, ...]}. Отсутствующие в списке пропускаются. """
+        recipes = self.get_bulk_recipes(request)
+        user = request.user
+        recipe_ids = [recipe.id for recipe in recipes]
+        self.lock(user, recipe_ids)
+        listed_ids = self.listed_ids(user, recipe_ids)
+        if listed_ids:
+            self.model.objects.filter(
+                user=user, recipe_id__in=listed_ids
+            ).delete()
+            self.change_counter(listed_ids, -1)
+            self.items_removed(user, listed_ids)
+            self.items_changed(request)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -210,6 +572,8 @@ class FavoriteViewSet(BaseItemFavoriteShopingCartViewSet):
 
     model = Favorite
     serializer_class = FavoriteSerializer
+    counter_field = 'favorites_count'
+    user_state_name = 'favorites'
     queryset = Favorite.objects.all()
     permission_classes = [IsAuthenticated]
 
@@ -222,5 +586,13 @@ class ShoppingCartViewSet(BaseItemFavoriteShopingCartViewSet):
 
     model = ShoppingCart
     serializer_class = ShoppingCartSerializer
+    counter_field = 'in_carts_count'
+    user_state_name = 'shopping_cart'
     queryset = ShoppingCart.objects.all()
     permission_classes = [IsAuthenticated]
+
+    def items_added(self, user, recipe_ids):
+        ShoppingListItem.objects.add_recipes(user.id, recipe_ids)
+
+    def items_removed(self, user, recipe_ids):
+        ShoppingListItem.objects.remove_recipes(user.id, recipe_ids)
@@ -0,0 +1,39 @@
+'''Версии данных в кэше для ETag, кэша страниц и производных словарей.
+Модуль общий для приложений, чтобы recipes не зависело от api.
+'''
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY_PREFIX = 'version:'
+
+
+def bump_versions(*keys):
+    """Отметка об изменении данных: новая версия — текущее время. """
+    now = time.time()
+    cache.set_many(
+        {f'{VERSION_KEY_PREFIX}{key}': now for key in keys}, timeout=None
+    )
+
+
+def bump_versions_on_commit(*keys):
+    """bump_versions() после фиксации текущей транзакции. Иначе
+    параллельный запрос может прочитать новую версию вместе
+    со старыми данными и закрепить их под новым ETag. """
+    transaction.on_commit(lambda: bump_versions(*keys))
+
+
+def get_versions(keys):
+    """Версии данных по ключам. Отсутствующая в кэше версия
+    считается изменившейся сейчас.
+    """
+    cache_keys = [f'{VERSION_KEY_PREFIX}{key}' for key in keys]
+    versions = cache.get_many(cache_keys)
+    missing = [key for key in cache_keys if key not in versions]
+    if missing:
+        now = time.time()
+        for key in missing:
+            cache.add(key, now, timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, time.time()) for key in cache_keys]
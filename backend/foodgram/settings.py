@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -62,7 +63,7 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', '/backend/db.sqlite3'),
         'USER': os.getenv('POSTGRES_USER', 'db_user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', '12345'),
@@ -103,7 +104,7 @@ AUTH_USER_MODEL = 'users.CustomUser'
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachingTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
@@ -124,6 +125,86 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'data'),)
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+    'pages': {
+        'BACKEND': os.getenv(
+            'PAGE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('PAGE_CACHE_LOCATION', 'foodgram_pages'),
+    },
+}
+
+PAGE_CACHE_ALIAS = 'pages'
+
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', 600))
+
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 300))
+
+TRENDING_WINDOW_DAYS = int(os.getenv('TRENDING_WINDOW_DAYS', 14))
+
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 48))
+
+TRENDING_FAVORITE_WEIGHT = 1.0
+
+TRENDING_SHOPPING_CART_WEIGHT = 0.5
+
+COOKABLE_INDEX_TTL = int(os.getenv('COOKABLE_INDEX_TTL', 600))
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+
+# Выход и изменения пользователя меняют его версию в общем кэше,
+# и кэшированные токены с прежней версией не принимаются ни одним
+# процессом; TTL лишь ограничивает срок жизни записи.
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 30))
+
+# Сколько секунд хранить токены в общем кэше (0 — не хранить).
+TOKEN_SHARED_CACHE_TIMEOUT = int(
+    os.getenv('TOKEN_SHARED_CACHE_TIMEOUT', 300)
+)
+
+# Сколько рецептов можно добавить в избранное или список покупок
+# (или удалить из них) одним запросом.
+BULK_RECIPES_LIMIT = int(os.getenv('BULK_RECIPES_LIMIT', 100))
+
+# Сколько секунд хранить в общем кэше избранное, список покупок
+# и подписки пользователя (0 — только в рамках запроса).
+USER_STATE_CACHE_TIMEOUT = int(os.getenv('USER_STATE_CACHE_TIMEOUT', 60))
+
+# Сколько первых рецептов ленты подписок держать в кэше (0 — не держать).
+FEED_HEAD_SIZE = int(os.getenv('FEED_HEAD_SIZE', 60))
+
+FEED_HEAD_TIMEOUT = int(os.getenv('FEED_HEAD_TIMEOUT', 3600))
+
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', 2))
+
+IMAGE_RENDITION_FORMAT = os.getenv('IMAGE_RENDITION_FORMAT', 'WEBP')
+
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+)
+
+IMAGE_UPLOAD_MAX_DIMENSION = int(os.getenv('IMAGE_UPLOAD_MAX_DIMENSION', 8000))
+
+# Изображения приходят в JSON строкой base64: тело запроса
+# на треть больше файла.
+DATA_UPLOAD_MAX_MEMORY_SIZE = IMAGE_UPLOAD_MAX_SIZE * 4 // 3 + 1024 * 1024
+
 
 DJOSER = {
     'LOGIN_FIELD': 'email',
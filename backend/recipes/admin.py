@@ -49,12 +49,15 @@ class RecipeAdmin(admin.ModelAdmin):
         'favorite_count',
         'display_tags'
     )
-    search_fields = ('name', 'author__username', 'favorite_count')
+    search_fields = ('name', 'author__username')
     list_filter = ('name', 'author', 'tags')
 
-    @admin.display(description='Количество добавлений в избранное')
+    @admin.display(
+        description='Количество добавлений в избранное',
+        ordering='favorites_count'
+    )
     def favorite_count(self, obj):
-        return obj.favorite.count()
+        return obj.favorites_count
 
     @admin.display(description='Отображение ингредиентов')
     def display_ingredients(self, recipe):
@@ -0,0 +1,87 @@
+'''Инвертированный индекс ингредиент → рецепты в памяти процесса
+для подбора рецептов по имеющимся продуктам. '''
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from recipes.models import RecipeIngredient
+
+
+class CookableIndex:
+    """Для каждого ингредиента хранит множество рецептов с ним,
+    для каждого рецепта — множество его ингредиентов. Подбор сводится
+    к подсчету пересечений, без обращения к базе.
+    Строится лениво, обновляется точечно при сохранении и удалении
+    рецептов в этом процессе и перестраивается не реже, чем раз
+    в COOKABLE_INDEX_TTL секунд (для остальных процессов).
+    """
+
+    def __init__(self):
+        self._postings = None
+        self._recipes = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def _expired(self):
+        return (
+            time.monotonic() - self._built_at
+            >= settings.COOKABLE_INDEX_TTL
+        )
+
+    def _ensure_built(self):
+        if self._postings is None or self._expired():
+            postings = defaultdict(set)
+            recipes = defaultdict(set)
+            for recipe_id, ingredient_id in (
+                RecipeIngredient.objects.order_by()
+                .values_list('recipe_id', 'ingredient_id').iterator()
+            ):
+                postings[ingredient_id].add(recipe_id)
+                recipes[recipe_id].add(ingredient_id)
+            self._postings, self._recipes = postings, recipes
+            self._built_at = time.monotonic()
+
+    def update_recipe(self, recipe_id, ingredient_ids):
+        """Замена набора ингредиентов рецепта в индексе. """
+        with self._lock:
+            if self._postings is None:
+                return
+            self._discard(recipe_id)
+            ingredient_ids = set(ingredient_ids)
+            self._recipes[recipe_id] = ingredient_ids
+            for ingredient_id in ingredient_ids:
+                self._postings[ingredient_id].add(recipe_id)
+
+    def remove_recipe(self, recipe_id):
+        with self._lock:
+            if self._postings is not None:
+                self._discard(recipe_id)
+
+    def _discard(self, recipe_id):
+        for ingredient_id in self._recipes.pop(recipe_id, ()):
+            self._postings[ingredient_id].discard(recipe_id)
+
+    def rank(self, ingredient_ids, max_missing=None):
+        """Рецепты, в которых есть хотя бы один из ingredient_ids:
+        список пар (id рецепта, число недостающих ингредиентов)
+        от полностью доступных к требующим докупки; при равенстве —
+        больше совпадений, затем новее.
+        """
+        with self._lock:
+            self._ensure_built()
+            matched = Counter()
+            for ingredient_id in set(ingredient_ids):
+                matched.update(self._postings.get(ingredient_id, ()))
+            ranked = [
+                (recipe_id, len(self._recipes[recipe_id]) - count, count)
+                for recipe_id, count in matched.items()
+            ]
+        if max_missing is not None:
+            ranked = [row for row in ranked if row[1] <= max_missing]
+        ranked.sort(key=lambda row: (row[1], -row[2], -row[0]))
+        return [(recipe_id, missing) for recipe_id, missing, _ in ranked]
+
+
+cookable_index = CookableIndex()
@@ -0,0 +1,60 @@
+'''Лента рецептов авторов, на которых подписан пользователь. '''
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.models import Recipe
+from users.models import Follow
+
+
+def followed_authors(user_id):
+    """Подзапрос: id авторов из подписок пользователя. """
+    return Follow.objects.filter(user_id=user_id).values('author_id')
+
+
+def head_key(user_id):
+    return f'feed_head:{user_id}'
+
+
+def get_head(user_id):
+    """Id первых FEED_HEAD_SIZE рецептов ленты, от новых к старым.
+    Хранятся в кэше, при отсутствии читаются одним запросом. """
+    key = head_key(user_id)
+    head = cache.get(key)
+    if head is None:
+        head = list(
+            Recipe.objects.filter(author_id__in=followed_authors(user_id))
+            .order_by('-pub_date', '-pk')
+            .values_list('pk', flat=True)[:settings.FEED_HEAD_SIZE]
+        )
+        cache.set(key, head, settings.FEED_HEAD_TIMEOUT)
+    return head
+
+
+def follower_keys(author_id):
+    return [
+        head_key(user_id) for user_id in Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+    ]
+
+
+def push_recipe(recipe):
+    """Новый рецепт в начало уже закэшированных лент подписчиков
+    автора; остальные ленты построятся при первом обращении. """
+    if not settings.FEED_HEAD_SIZE:
+        return
+    heads = cache.get_many(follower_keys(recipe.author_id))
+    cache.set_many({
+        key: [recipe.pk, *head][:settings.FEED_HEAD_SIZE]
+        for key, head in heads.items() if recipe.pk not in head
+    }, settings.FEED_HEAD_TIMEOUT)
+
+
+def forget_author(author_id):
+    """Сброс лент подписчиков автора (рецепт удален). """
+    cache.delete_many(follower_keys(author_id))
+
+
+def forget_user(user_id):
+    """Сброс ленты пользователя (изменились подписки). """
+    cache.delete(head_key(user_id))
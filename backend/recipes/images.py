@@ -0,0 +1,132 @@
+'''Уменьшенные копии изображений рецептов разных размеров.
+Оригинал сохраняется в запросе как есть, копии нарезаются
+в фоновом пуле потоков после фиксации транзакции.
+'''
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image
+
+from foodgram.cache_versions import bump_versions
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'recipes/renditions'
+
+# Наибольшие ширина и высота каждой копии; пропорции сохраняются.
+RENDITIONS = {
+    'thumbnail': (320, 320),
+    'card': (800, 800),
+    'full': (1600, 1600),
+}
+
+FORMATS = {
+    'WEBP': ('webp', {'quality': 80, 'method': 4}),
+    'JPEG': ('jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+# Изображения, уже стоящие в очереди пула: одно и то же изображение
+# у нескольких рецептов нарезается один раз.
+_pending = set()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+        return _executor
+
+
+def rendition_name(image_name, rendition):
+    """Путь копии rendition изображения image_name в хранилище. """
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    extension = FORMATS[settings.IMAGE_RENDITION_FORMAT][0]
+    return f'{RENDITIONS_DIR}/{stem}/{rendition}.{extension}'
+
+
+def render(image_name, force=False):
+    """Нарезка всех копий изображения image_name. Копии хранятся
+    в хранилище по умолчанию; если все они уже есть (то же изображение
+    у другого рецепта), нарезка пропускается, если не задан force. """
+    names = {
+        rendition: rendition_name(image_name, rendition)
+        for rendition in RENDITIONS
+    }
+    if not force and all(map(default_storage.exists, names.values())):
+        return
+    image_format = settings.IMAGE_RENDITION_FORMAT
+    options = FORMATS[image_format][1]
+    source_storage = Recipe._meta.get_field('image').storage
+    with source_storage.open(image_name) as source, \
+            Image.open(source) as image:
+        image.load()
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        for rendition, size in RENDITIONS.items():
+            copy = image.copy()
+            copy.thumbnail(size, Image.LANCZOS)
+            buffer = io.BytesIO()
+            copy.save(buffer, image_format, **options)
+            if default_storage.exists(names[rendition]):
+                default_storage.delete(names[rendition])
+            default_storage.save(
+                names[rendition], ContentFile(buffer.getvalue())
+            )
+
+
+def process_image(image_name, force=False):
+    """Нарезка копий и отметка рецептов с этим изображением.
+    Рецепты, успевшие сменить изображение, не отмечаются. """
+    try:
+        render(image_name, force)
+        recipes = Recipe.objects.filter(
+            image=image_name, image_processed=False
+        )
+        recipe_ids = list(recipes.values_list('pk', flat=True))
+        if recipe_ids:
+            recipes.update(image_processed=True)
+            bump_versions(
+                *(f'recipe:{recipe_id}' for recipe_id in recipe_ids),
+                'recipe_list'
+            )
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', image_name)
+    finally:
+        # Соединение потока пула не закрывается обработчиком запроса.
+        connection.close()
+
+
+def process_pending(image_name):
+    try:
+        process_image(image_name)
+    finally:
+        with _executor_lock:
+            _pending.discard(image_name)
+
+
+def submit(image_name):
+    executor = get_executor()
+    with _executor_lock:
+        if image_name in _pending:
+            return
+        _pending.add(image_name)
+    executor.submit(process_pending, image_name)
+
+
+def schedule(image_name):
+    """Обработка изображения в фоне после фиксации транзакции. """
+    transaction.on_commit(lambda: submit(image_name))
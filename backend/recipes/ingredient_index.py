@@ -0,0 +1,79 @@
+'''Индекс ингредиентов в памяти процесса для автодополнения. '''
+import threading
+from bisect import bisect_left
+
+from foodgram.cache_versions import get_versions
+from recipes.models import Ingredient
+
+
+def normalize(text):
+    """Ключ поиска: без учета регистра, «ё» приравнена к «е». """
+    return text.casefold().replace('ё', 'е').strip()
+
+
+class IngredientIndex:
+    """Отсортированный по названию список ингредиентов.
+    Строится лениво при первом обращении и перестраивается, когда
+    в общем кэше меняется версия ingredients, — во всех процессах,
+    как и ETag списка ингредиентов.
+    """
+
+    def __init__(self):
+        self._index = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        # Версия читается до базы: изменение, зафиксированное во время
+        # построения, сменит ее, и индекс будет построен заново.
+        version, = get_versions(['ingredients'])
+        if self._version == version:
+            return self._index
+        with self._lock:
+            if self._version != version:
+                self._index = self._build()
+                self._version = version
+            return self._index
+
+    @staticmethod
+    def _build():
+        rows = sorted(
+            (normalize(name), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit'
+            )
+        )
+        keys = [row[0] for row in rows]
+        entries = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in rows
+        ]
+        return keys, entries
+
+    def all(self):
+        return list(self._get()[1])
+
+    def search(self, query, limit=None):
+        """Ингредиенты, название которых начинается с query,
+        а за ними — содержащие query в середине названия.
+        """
+        keys, entries = self._get()
+        query = normalize(query)
+        if limit is None:
+            limit = len(entries)
+        result = []
+        start = bisect_left(keys, query)
+        for position in range(start, len(keys)):
+            if len(result) >= limit or not keys[position].startswith(query):
+                break
+            result.append(entries[position])
+        if len(result) < limit:
+            for key, entry in zip(keys, entries):
+                if query in key and not key.startswith(query):
+                    result.append(entry)
+                    if len(result) >= limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,98 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import search
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from users.models import CustomUser
+
+BATCH_SIZE = 2000
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Замеряет поиск рецептов на сгенерированном корпусе. '
+            'Корпус создается в транзакции и откатывается после замеров.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        ingredients = list(Ingredient.objects.values_list('id', 'name'))
+        if not ingredients:
+            self.stderr.write('Нет ингредиентов: выполните import_csv')
+            return
+        author = CustomUser.objects.create_user(
+            email='benchmark@foodgram.local', username='benchmark',
+            first_name='benchmark', last_name='benchmark',
+            password=None
+        )
+        started = time.perf_counter()
+        for offset in range(0, options['recipes'], BATCH_SIZE):
+            size = min(BATCH_SIZE, options['recipes'] - offset)
+            Recipe.objects.bulk_create(
+                self.make_recipe(author, ingredients) for _ in range(size)
+            )
+            recipe_ids = list(
+                Recipe.objects.filter(author=author).order_by('pk')
+                .values_list('pk', flat=True)[offset:offset + size]
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id,
+                    amount=random.randint(1, 500)
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id, _ in random.sample(ingredients, 8)
+            )
+            search.index_recipes(recipe_ids)
+        self.stdout.write(
+            f'Корпус: {options["recipes"]} рецептов, '
+            f'{time.perf_counter() - started:.1f} с'
+        )
+        terms = [
+            random.choice(ingredients)[1].split()[0]
+            for _ in range(options['queries'])
+        ]
+        for label, method in (
+            ('индекс', search.search),
+            ('icontains', search.search_icontains),
+        ):
+            timings = []
+            for term in terms:
+                query_started = time.perf_counter()
+                list(method(Recipe.objects.all(), term)[:options['limit']])
+                timings.append((time.perf_counter() - query_started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'{label}: медиана {statistics.median(timings):.1f} мс, '
+                f'p95 {timings[int(len(timings) * 0.95) - 1]:.1f} мс'
+            )
+
+    @staticmethod
+    def make_recipe(author, ingredients):
+        words = [name for _, name in random.sample(ingredients, 3)]
+        return Recipe(
+            author=author,
+            name=' '.join(words[:2]),
+            text=f'Смешайте {words[0]} и {words[1]}, добавьте {words[2]}.',
+            cooking_time=random.randint(1, 180),
+        )
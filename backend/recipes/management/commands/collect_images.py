@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from recipes import images
+from recipes.models import Recipe
+
+
+def walk(storage, path):
+    """Все файлы каталога path хранилища, включая вложенные. """
+    if not storage.exists(path):
+        return
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield f'{path}/{name}'
+    for directory in directories:
+        yield from walk(storage, f'{path}/{directory}')
+
+
+class Command(BaseCommand):
+    help = ('Удаляет изображения рецептов и их уменьшенные копии, на которые '
+            'не ссылается ни один рецепт. Файлы моложе --grace-hours '
+            'не трогаются: их рецепт может быть еще не сохранен.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено',
+        )
+
+    def handle(self, *args, **options):
+        field = Recipe._meta.get_field('image')
+        references = dict(
+            Recipe.objects.exclude(image='').exclude(image=None).order_by()
+            .values_list('image').annotate(refs=Count('pk'))
+        )
+        self.stdout.write(
+            f'Изображений в рецептах: {len(references)}, '
+            f'общих для нескольких рецептов: '
+            f'{sum(refs > 1 for refs in references.values())}'
+        )
+        renditions = {
+            images.rendition_name(name, rendition)
+            for name in references
+            for rendition in images.RENDITIONS
+        }
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        orphans = [
+            (field.storage, name)
+            for name in walk(field.storage, field.upload_to.strip('/'))
+            if name not in references
+        ] + [
+            (default_storage, name)
+            for name in walk(default_storage, images.RENDITIONS_DIR)
+            if name not in renditions
+        ]
+        deleted = freed = 0
+        for storage, name in orphans:
+            if storage.get_modified_time(name) > cutoff:
+                continue
+            deleted += 1
+            freed += storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                storage.delete(name)
+        action = 'К удалению' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} файлов: {deleted}, {freed / 1024 / 1024:.1f} МБ'
+        ))
@@ -4,6 +4,7 @@ import os
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from foodgram.cache_versions import bump_versions
 from recipes.models import Ingredient, Tag
 
 DICT_MODELS_RECIPES = {
@@ -33,6 +34,9 @@ class Command(BaseCommand):
                 f'Данные из {csv_file} успешно загружены в базу данных'
             ))
 
+        # bulk_create() не вызывает сигналы: версии меняются явно,
+        # чтобы процессы перестроили индексы и ETag.
+        bump_versions('ingredients', 'tags', 'recipe_list')
         self.stdout.write(self.style.SUCCESS(
             'Все данные успешно загружены в базу данных!'
         ))
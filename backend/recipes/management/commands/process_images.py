@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from recipes import images
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Нарезает уменьшенные копии изображений рецептов, '
+            'для которых они еще не готовы (например, загруженных '
+            'до появления фоновой обработки или при ее сбое).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии для всех рецептов',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(image=None)
+        if options['all']:
+            recipes.update(image_processed=False)
+        names = list(
+            recipes.filter(image_processed=False).order_by()
+            .values_list('image', flat=True).distinct()
+        )
+        for name in names:
+            images.process_image(name, options['all'])
+        processed = Recipe.objects.filter(
+            image__in=names, image_processed=True
+        ).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {len(names)}, рецептов: {processed}'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс рецептов'
+
+    def handle(self, *args, **options):
+        search.index_recipes()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен'))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает сводные списки покупок по корзинам '
+            'или проверяет их актуальность (--check)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить списки покупок, ничего не меняя',
+        )
+
+    def handle(self, *args, **options):
+        expected = ShoppingListItem.objects.aggregate_from_carts()
+        if options['check']:
+            stored = {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount
+                in ShoppingListItem.objects.values_list(
+                    'user_id', 'ingredient_id', 'amount'
+                )
+            }
+            mismatched = {
+                key for key in expected.keys() | stored.keys()
+                if expected.get(key) != stored.get(key)
+            }
+            if mismatched:
+                raise CommandError(
+                    f'Расхождений в списках покупок: {len(mismatched)}'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                'Списки покупок актуальны'
+            ))
+            return
+
+        with transaction.atomic():
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create(
+                ShoppingListItem(
+                    user_id=user_id, ingredient_id=ingredient_id,
+                    amount=amount
+                )
+                for (user_id, ingredient_id), amount in expected.items()
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересчитаны, строк: {len(expected)}'
+        ))
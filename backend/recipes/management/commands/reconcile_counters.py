@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import CustomUser, Follow
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (CustomUser, 'recipes_count', Recipe, 'author'),
+    (CustomUser, 'followers_count', Follow, 'author'),
+)
+
+
+def count_of(model, field):
+    """Подзапрос: число строк model, ссылающихся на текущую запись. """
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Сверяет денормализованные счетчики рецептов и пользователей '
+            'с данными и исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить счетчики, ничего не меняя',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, counter, related_model, field in COUNTERS:
+            drifted = model.objects.annotate(
+                actual=count_of(related_model, field)
+            ).filter(~Q(**{counter: F('actual')}))
+            mismatched = drifted.count()
+            total += mismatched
+            if mismatched and not options['check']:
+                model.objects.filter(
+                    pk__in=drifted.values('pk')
+                ).update(**{counter: count_of(related_model, field)})
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}.{counter}: '
+                f'расхождений {mismatched}'
+            )
+        if options['check'] and total:
+            raise CommandError(f'Расхождений в счетчиках: {total}')
+        self.stdout.write(self.style.SUCCESS('Счетчики сверены'))
@@ -0,0 +1,50 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from foodgram.cache_versions import bump_versions
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+SOURCES = (
+    (Favorite, 'TRENDING_FAVORITE_WEIGHT'),
+    (ShoppingCart, 'TRENDING_SHOPPING_CART_WEIGHT'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает trending_score рецептов по недавним добавлениям '
+            'в избранное и списки покупок. Запускается по расписанию.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        since = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+        half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+        scores = defaultdict(float)
+        for model, weight_setting in SOURCES:
+            weight = getattr(settings, weight_setting)
+            rows = model.objects.filter(
+                added_at__gte=since
+            ).values_list('recipe_id', 'added_at').iterator()
+            for recipe_id, added_at in rows:
+                age = (now - added_at).total_seconds()
+                scores[recipe_id] += weight * math.pow(0.5, age / half_life)
+
+        with transaction.atomic():
+            Recipe.objects.exclude(pk__in=scores).exclude(
+                trending_score=0
+            ).update(trending_score=0)
+            recipes = list(Recipe.objects.filter(pk__in=scores).only('pk'))
+            for recipe in recipes:
+                recipe.trending_score = scores[recipe.pk]
+            Recipe.objects.bulk_update(
+                recipes, ['trending_score'], batch_size=1000
+            )
+        bump_versions('recipe_list')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлена популярность рецептов: {len(recipes)}'
+        ))
@@ -0,0 +1,91 @@
+# Generated by Django 3.2.3 on 2026-10-17 04:17
+
+from collections import defaultdict
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Копия SQL из recipes.search на момент миграции: история миграций
+# не должна меняться вместе с модулем поиска.
+FTS_TABLE = 'recipes_recipe_fts'
+
+PG_UPDATE_SQL = (
+    "UPDATE recipes_recipe SET search_vector = "
+    "setweight(to_tsvector('russian', %s), 'A') || "
+    "setweight(to_tsvector('russian', %s), 'B') || "
+    "setweight(to_tsvector('russian', %s), 'C') "
+    "WHERE id = %s"
+)
+
+
+def collect_documents(apps):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ingredients = defaultdict(list)
+    for recipe_id, name in RecipeIngredient.objects.order_by().values_list(
+        'recipe_id', 'ingredient__name'
+    ).iterator():
+        ingredients[recipe_id].append(name)
+    for pk, name, text in Recipe.objects.order_by().values_list(
+        'pk', 'name', 'text'
+    ).iterator():
+        yield pk, name, text, ' '.join(ingredients[pk])
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX recipe_search_vector_idx '
+            'ON recipes_recipe USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+            'name, ingredients, text, '
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+    else:
+        return
+    documents = list(collect_documents(apps))
+    if not documents:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.executemany(PG_UPDATE_SQL, [
+                (name, ingredients, text, pk)
+                for pk, name, text, ingredients in documents
+            ])
+        else:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+                'VALUES (%s, %s, %s, %s)',
+                [
+                    (pk, name, ingredients, text)
+                    for pk, name, text, ingredients in documents
+                ]
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый индекс'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
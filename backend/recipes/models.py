@@ -1,11 +1,16 @@
 from typing import Optional
 
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.db.models import Exists, OuterRef
+from django.db import models, transaction
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch, Sum,
+                              Value, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 
-from users.models import CustomUser
+from recipes.storage import ContentAddressedStorage
+from users.models import CustomUser, DenormalizedFieldsMixin
 
 User = get_user_model()
 
@@ -46,20 +51,77 @@ class Tag(models.Model):
 
 class RecipeQuerySet(models.QuerySet):
     """Вспомогательная модель отображения
-    отметки "в избранном" для списка рецептов.
+    отметок "в избранном" и "в списке покупок" для списка рецептов.
     """
 
     def add_user_annotations(self, user_id: Optional[int]):
+        if user_id is None:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
         return self.annotate(
-            is_favorite=Exists(
+            is_favorited=Exists(
                 Favorite.objects.filter(
                     user_id=user_id, recipe__pk=OuterRef('pk')
                 )
             ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(
+                    user_id=user_id, recipe__pk=OuterRef('pk')
+                )
+            ),
         )
 
+    def with_related(self, fields=None):
+        """Подгрузка автора, тегов и ингредиентов фиксированным
+        числом запросов вне зависимости от количества рецептов.
+        Если задан набор полей ответа fields, подгружается только нужное.
+        """
+        queryset = self
+        if fields is None or 'author' in fields:
+            queryset = queryset.select_related('author')
+        if fields is None or 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if fields is None or 'ingredients' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ))
+        return queryset
+
+    def for_read(self, user_id: Optional[int], fields=None):
+        """Queryset для чтения рецептов без N+1 запросов.
+        Поисковый вектор не читается, текст — только если он
+        есть в fields. """
+        queryset = self.with_related(fields).defer('search_vector')
+        if fields is not None and 'text' not in fields:
+            queryset = queryset.defer('text')
+        return queryset.add_user_annotations(user_id)
+
+    def latest_per_author(self, limit: int):
+        """Не более limit последних рецептов каждого автора.
+        Нумерация внутри автора считается оконной функцией ROW_NUMBER
+        в одном запросе, а не отдельным LIMIT на каждого автора.
+        """
+        ranked = self.order_by().annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('pk').desc()),
+            )
+        ).values('pk', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.filter(
+            pk__in=RawSQL(
+                f'SELECT "id" FROM ({sql}) AS "ranked" '
+                f'WHERE "row_number" <= %s',
+                (*params, limit)
+            )
+        )
 
-class Recipe(models.Model):
+
+class Recipe(DenormalizedFieldsMixin, models.Model):
     """Модель рецепта. """
 
     author = models.ForeignKey(
@@ -75,9 +137,15 @@ class Recipe(models.Model):
     image = models.ImageField(
         "Ссылка на изображение",
         upload_to="recipes/images/",
+        storage=ContentAddressedStorage(),
         null=True,
         default=None
     )
+    image_processed = models.BooleanField(
+        'Уменьшенные копии изображения готовы',
+        default=False,
+        editable=False
+    )
     text = models.TextField(verbose_name='Текст')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -102,11 +170,54 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True
     )
+    favorites_count = models.PositiveIntegerField(
+        'Количество добавлений в избранное',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Количество добавлений в списки покупок',
+        default=0,
+        editable=False
+    )
+    trending_score = models.FloatField(
+        'Популярность за последнее время',
+        default=0,
+        editable=False
+    )
+    search_vector = SearchVectorField(
+        'Поисковый индекс',
+        null=True,
+        editable=False
+    )
 
     objects = RecipeQuerySet.as_manager()
 
+    denormalized_fields = (
+        'favorites_count', 'in_carts_count', 'trending_score',
+        'search_vector', 'image_processed',
+    )
+
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=('-favorites_count', '-pub_date'),
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=('-trending_score', '-pub_date'),
+                name='recipe_trending_idx'
+            ),
+            models.Index(
+                fields=('cooking_time', '-pub_date'),
+                name='recipe_cooking_time_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -182,11 +293,16 @@ class AbstractFavoriteShopping(models.Model):
         verbose_name='Рецепт',
         on_delete=models.CASCADE
     )
+    added_at = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True,
+        db_index=True
+    )
 
     class Meta:
         constraints = [
             models.UniqueConstraint(
-                fields=('user', 'recipe'), name='unique_user_recipe_list'
+                fields=('user', 'recipe'), name='unique_%(class)s_user_recipe'
             )
         ]
         abstract = True
@@ -195,7 +311,7 @@ class AbstractFavoriteShopping(models.Model):
 class Favorite(AbstractFavoriteShopping):
     """Модель избранных рецептов. """
 
-    class Meta:
+    class Meta(AbstractFavoriteShopping.Meta):
         default_related_name = 'favorite'
         verbose_name = 'Объект избранного'
         verbose_name_plural = 'Объекты избранного'
@@ -207,10 +323,158 @@ class Favorite(AbstractFavoriteShopping):
 class ShoppingCart(AbstractFavoriteShopping):
     """Модель списка покупок. """
 
-    class Meta:
+    class Meta(AbstractFavoriteShopping.Meta):
         default_related_name = 'shopping_cart'
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
 
     def __str__(self):
         return f'Список покупок пользователя {self.user.username}'
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    """Инкрементальное обновление сводного списка покупок. """
+
+    def apply_delta(self, user_ids, deltas):
+        """Прибавляет deltas ({ingredient_id: количество}) к списку покупок
+        каждого из пользователей user_ids. Строки с нулевым итогом
+        удаляются. Пользователи блокируются, как при изменении корзины,
+        поэтому параллельные изменения их списков не создают одну
+        и ту же строку дважды.
+        """
+        user_ids = list(user_ids)
+        deltas = {key: value for key, value in deltas.items() if value}
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic():
+            lock_users(user_ids)
+            existing = {
+                (item.user_id, item.ingredient_id): item
+                for item in self.select_for_update().filter(
+                    user_id__in=user_ids, ingredient_id__in=deltas
+                )
+            }
+            to_create, to_update, to_delete = [], [], []
+            for user_id in user_ids:
+                for ingredient_id, delta in deltas.items():
+                    item = existing.get((user_id, ingredient_id))
+                    if item is None:
+                        if delta > 0:
+                            to_create.append(self.model(
+                                user_id=user_id,
+                                ingredient_id=ingredient_id,
+                                amount=delta,
+                            ))
+                        continue
+                    item.amount += delta
+                    if item.amount > 0:
+                        to_update.append(item)
+                    else:
+                        to_delete.append(item.pk)
+            self.bulk_create(to_create)
+            self.bulk_update(to_update, ['amount'])
+            self.filter(pk__in=to_delete).delete()
+
+    def add_recipes(self, user_id, recipe_ids):
+        """Добавление ингредиентов рецептов в список покупок. """
+        self.apply_delta([user_id], recipes_amounts(recipe_ids))
+
+    def remove_recipes(self, user_id, recipe_ids):
+        """Вычитание ингредиентов рецептов из списка покупок. """
+        amounts = recipes_amounts(recipe_ids)
+        self.apply_delta(
+            [user_id], {key: -value for key, value in amounts.items()}
+        )
+
+    def aggregate_from_carts(self):
+        """Итоги, посчитанные заново по рецептам в корзинах:
+        {(user_id, ingredient_id): количество}.
+        """
+        rows = RecipeIngredient.objects.filter(
+            recipe__shopping_cart__isnull=False
+        ).values_list(
+            'recipe__shopping_cart__user_id', 'ingredient_id'
+        ).annotate(total=Sum('amount')).order_by()
+        return {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in rows
+        }
+
+
+def lock_recipes(recipe_ids):
+    """Блокировка строк рецептов до конца транзакции, по возрастанию id.
+    Рецепты всегда блокируются раньше пользователей (lock_users): так
+    изменение рецепта и добавление его в корзину выполняются по очереди
+    и не ждут друг друга по кругу.
+    """
+    list(Recipe.objects.select_for_update().filter(
+        pk__in=recipe_ids
+    ).order_by('pk').values_list('pk'))
+
+
+def lock_users(user_ids):
+    """Блокировка строк пользователей до конца транзакции.
+    Строки блокируются по возрастанию id, чтобы транзакции,
+    блокирующие нескольких пользователей, не ждали друг друга по кругу.
+    """
+    list(CustomUser.objects.select_for_update().filter(
+        pk__in=user_ids
+    ).order_by('pk').values_list('pk'))
+
+
+def recipe_amounts(recipe_id):
+    """Количества ингредиентов рецепта: {ingredient_id: количество}. """
+    return dict(
+        RecipeIngredient.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('ingredient_id', 'amount')
+    )
+
+
+def recipes_amounts(recipe_ids):
+    """Суммарные количества ингредиентов рецептов:
+    {ingredient_id: количество}. """
+    return dict(
+        RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id').annotate(
+            total=Sum('amount')
+        ).order_by()
+    )
+
+
+class ShoppingListItem(models.Model):
+    """Сводный список покупок пользователя:
+    суммарное количество каждого ингредиента из рецептов в корзине.
+    Поддерживается инкрементально при изменении корзины и рецептов.
+    """
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество'
+    )
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        default_related_name = 'shopping_list'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_user_ingredient_shopping_list'
+            )
+        ]
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.amount} у {self.user}'
@@ -0,0 +1,155 @@
+'''Полнотекстовый поиск рецептов по названию, описанию и ингредиентам.
+В PostgreSQL индекс — колонка search_vector (tsvector с русской
+морфологией) под GIN-индексом, в SQLite — таблица FTS5.
+На остальных СУБД поиск сводится к icontains.
+'''
+import re
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Exists, F, OuterRef, Q
+from django.db.models.expressions import RawSQL
+
+from recipes.models import Recipe, RecipeIngredient
+
+FTS_TABLE = 'recipes_recipe_fts'
+
+PG_UPDATE_SQL = (
+    "UPDATE recipes_recipe SET search_vector = "
+    "setweight(to_tsvector('russian', %s), 'A') || "
+    "setweight(to_tsvector('russian', %s), 'B') || "
+    "setweight(to_tsvector('russian', %s), 'C') "
+    "WHERE id = %s"
+)
+
+
+def create_index(schema_editor):
+    """Создание поискового индекса для текущей СУБД. """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX recipe_search_vector_idx '
+            'ON recipes_recipe USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+            'name, ingredients, text, '
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def write_documents(documents, using=None):
+    """Запись документов (id, название, описание, ингредиенты)
+    в поисковый индекс. """
+    using = using or connection
+    documents = list(documents)
+    if not documents:
+        return
+    with using.cursor() as cursor:
+        if using.vendor == 'postgresql':
+            cursor.executemany(PG_UPDATE_SQL, [
+                (name, ingredients, text, pk)
+                for pk, name, text, ingredients in documents
+            ])
+        elif using.vendor == 'sqlite':
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(pk,) for pk, *_ in documents]
+            )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+                'VALUES (%s, %s, %s, %s)',
+                [
+                    (pk, name, ingredients, text)
+                    for pk, name, text, ingredients in documents
+                ]
+            )
+
+
+def collect_documents(recipe_model, recipe_ingredient_model, recipe_ids=None):
+    """Документы для индекса по моделям рецептов и ингредиентов
+    в рецептах (подходят и исторические модели миграций). """
+    recipes = recipe_model.objects.order_by()
+    recipe_ingredients = recipe_ingredient_model.objects.order_by()
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+        recipe_ingredients = recipe_ingredients.filter(
+            recipe_id__in=recipe_ids
+        )
+    ingredients = defaultdict(list)
+    for recipe_id, name in recipe_ingredients.values_list(
+        'recipe_id', 'ingredient__name'
+    ).iterator():
+        ingredients[recipe_id].append(name)
+    for pk, name, text in recipes.values_list(
+        'pk', 'name', 'text'
+    ).iterator():
+        yield pk, name, text, ' '.join(ingredients[pk])
+
+
+def index_recipes(recipe_ids=None):
+    """Обновление индекса для рецептов recipe_ids (или всех). """
+    write_documents(collect_documents(Recipe, RecipeIngredient, recipe_ids))
+
+
+def remove_recipes(recipe_ids):
+    """Удаление рецептов из индекса SQLite
+    (в PostgreSQL вектор удаляется вместе со строкой). """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(pk,) for pk in recipe_ids]
+            )
+
+
+def fts_query(text):
+    """Запрос FTS5: каждое слово в кавычках и с поиском по префиксу. """
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search(queryset, text):
+    """Рецепты, подходящие под запрос, по убыванию релевантности. """
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        query = SearchQuery(text, config='russian', search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-pub_date', '-id')
+    if connection.vendor == 'sqlite':
+        match = fts_query(text)
+        if not match:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,)
+        )).annotate(rank=RawSQL(
+            f'SELECT bm25({FTS_TABLE}, 10.0, 4.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND {FTS_TABLE}.rowid = recipes_recipe.id',
+            (match,)
+        )).order_by('rank', '-pub_date', '-id')
+    return search_icontains(queryset, text)
+
+
+def search_icontains(queryset, text):
+    """Поиск без индекса: подстрока в названии, описании
+    или названии ингредиента. """
+    return queryset.filter(
+        Q(name__icontains=text)
+        | Q(text__icontains=text)
+        | Q(Exists(RecipeIngredient.objects.filter(
+            recipe_id=OuterRef('pk'), ingredient__name__icontains=text
+        )))
+    )
@@ -0,0 +1,35 @@
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from recipes import images
+from recipes.models import Recipe
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_image_saving(sender, instance, update_fields=None, **kwargs):
+    """Сменилось ли изображение по сравнению с записанным в базе:
+    так учитываются и изменения из админки и скриптов. """
+    instance._image_changed = False
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if instance._state.adding:
+        instance._image_changed = bool(instance.image)
+        return
+    stored = Recipe.objects.filter(pk=instance.pk).values_list(
+        'image', flat=True
+    ).first()
+    instance._image_changed = (
+        bool(instance.image) and instance.image.name != stored
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, created, **kwargs):
+    """Новое изображение: копии прежнего не подходят, новые
+    нарезаются в фоне. """
+    if not getattr(instance, '_image_changed', False):
+        return
+    if not created:
+        Recipe.objects.filter(pk=instance.pk).update(image_processed=False)
+    instance.image_processed = False
+    images.schedule(instance.image.name)
@@ -0,0 +1,39 @@
+'''Хранилище файлов с адресацией по содержимому. '''
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файл сохраняется под SHA-256 своего содержимого:
+    <каталог upload_to>/<первые 2 знака>/<хэш><расширение>.
+    Одинаковые файлы записываются на диск один раз, повторная
+    загрузка только возвращает имя уже сохраненного и обновляет время
+    изменения файла. Файлы, на которые больше не ссылается ни один
+    рецепт и которые старше --grace-hours, удаляет команда
+    collect_images.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        hexdigest = digest.hexdigest()
+        name = os.path.join(
+            directory, hexdigest[:2], hexdigest + extension
+        ).replace('\\', '/')
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return self._save(name, content)
@@ -0,0 +1,147 @@
+import base64
+import io
+
+import pytest
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import CustomUser
+
+
+@pytest.fixture(autouse=True)
+def clear_caches(settings):
+    """Кэши страниц, версий и отметок пользователей не переживают тест. """
+    for alias in settings.CACHES:
+        caches[alias].clear()
+    yield
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
+@pytest.fixture
+def image():
+    """Изображение для API: строка base64 с заголовком data:. """
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), 'red').save(buffer, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+@pytest.fixture
+def author_client(author):
+    client = APIClient()
+    client.force_authenticate(author)
+    return client
+
+
+@pytest.fixture
+def count_queries(settings):
+    """Число запросов к базе при GET-запросе с холодными кэшами. """
+    def count_queries(client, url):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        assert response.status_code == 200, response.content
+        return len(context.captured_queries)
+    return count_queries
+
+
+@pytest.fixture
+def make_user(db):
+    def make_user(username):
+        return CustomUser.objects.create_user(
+            username=username,
+            email=f'{username}@foodgram.ru',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='Pass-12345',
+        )
+    return make_user
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user('user')
+
+
+@pytest.fixture
+def author(make_user):
+    return make_user('author')
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=name, color=color, slug=slug)
+        for name, color, slug in (
+            ('Завтрак', '#E26C2D', 'breakfast'),
+            ('Обед', '#49B64E', 'lunch'),
+            ('Ужин', '#8775D2', 'dinner'),
+        )
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г'
+        )
+        for number in range(10)
+    ]
+
+
+@pytest.fixture
+def make_recipes(tags, ingredients):
+    """Рецепты автора с двумя тегами и тремя ингредиентами каждый.
+    Счетчик рецептов автора увеличивается, как при создании через API. """
+    def make_recipes(author, count):
+        recipes = []
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+                image='recipes/images/recipe.png',
+            )
+            recipe.tags.set(tags[number % 2:number % 2 + 2])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredients[(number + shift) % 10],
+                    amount=shift + 1,
+                )
+                for shift in range(3)
+            ])
+            recipes.append(recipe)
+        CustomUser.objects.filter(pk=author.pk).update(
+            recipes_count=F('recipes_count') + count
+        )
+        return recipes
+    return make_recipes
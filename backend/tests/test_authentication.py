@@ -0,0 +1,71 @@
+import pytest
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import forget_tokens, token_cache, version_key
+from foodgram.cache_versions import bump_versions
+from users.models import CustomUser
+
+
+@pytest.fixture
+def token_client(user):
+    token = Token.objects.create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    yield client
+    token_cache.delete(token.key)
+
+
+@pytest.mark.django_db
+class TestCachingTokenAuthentication:
+
+    def test_logout_rejects_cached_token(
+        self, token_client, django_capture_on_commit_callbacks
+    ):
+        assert token_client.get('/api/users/me/').status_code == 200
+        with django_capture_on_commit_callbacks(execute=True):
+            response = token_client.post('/api/auth/token/logout/')
+        assert response.status_code == 204
+        assert token_client.get('/api/users/me/').status_code == 401
+
+    def test_user_change_in_other_process_rejects_cached_user(
+        self, user, token_client
+    ):
+        assert token_client.get('/api/users/me/').status_code == 200
+        CustomUser.objects.filter(pk=user.pk).update(first_name='Новое имя')
+        # Пользователь изменен в другом процессе: в общем кэше сменилась
+        # версия, а кэш токенов этого процесса не тронут.
+        bump_versions(version_key(Token.objects.get(user=user).key))
+        response = token_client.get('/api/users/me/')
+        assert response.data['first_name'] == 'Новое имя'
+
+    def test_logout_during_lookup_rejects_cached_token(
+        self, monkeypatch, token_client
+    ):
+        lookup = TokenAuthentication.authenticate_credentials
+
+        def lookup_then_logout(self, key):
+            result = lookup(self, key)
+            # Выход зафиксирован после чтения токена из базы.
+            Token.objects.filter(key=key).delete()
+            forget_tokens([key])
+            return result
+
+        monkeypatch.setattr(
+            TokenAuthentication, 'authenticate_credentials',
+            lookup_then_logout
+        )
+        assert token_client.get('/api/users/me/').status_code == 200
+        monkeypatch.undo()
+        assert token_client.get('/api/users/me/').status_code == 401
+
+    def test_unsafe_request_reads_user_from_db(
+        self, user, token_client, django_assert_num_queries
+    ):
+        etag = token_client.get('/api/tags/')['ETag']
+        with django_assert_num_queries(0):
+            response = token_client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        CustomUser.objects.filter(pk=user.pk).update(is_active=False)
+        assert token_client.post('/api/tags/').status_code == 401
@@ -0,0 +1,101 @@
+import time
+
+import pytest
+from django.utils.http import http_date
+
+from foodgram.cache_versions import bump_versions, get_versions
+from recipes.models import Ingredient
+
+
+@pytest.mark.django_db
+class TestVersions:
+
+    def test_bumped_after_commit(
+        self, api_client, tags, django_capture_on_commit_callbacks
+    ):
+        response = api_client.get('/api/tags/')
+        etag = response['ETag']
+        version, = get_versions(['tags'])
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            tags[0].name = 'Полдник'
+            tags[0].save()
+            assert get_versions(['tags']) == [version]
+            assert api_client.get(
+                '/api/tags/', HTTP_IF_NONE_MATCH=etag
+            ).status_code == 304
+        assert callbacks
+        assert get_versions(['tags']) != [version]
+        response = api_client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response['ETag'] != etag
+
+    def test_if_modified_since_is_ignored(self, api_client, tags):
+        response = api_client.get('/api/tags/')
+        assert not response.has_header('Last-Modified')
+        # Изменение в ту же секунду, что и предыдущий ответ.
+        bump_versions('tags')
+        response = api_client.get(
+            '/api/tags/', HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 1)
+        )
+        assert response.status_code == 200
+
+
+@pytest.mark.django_db
+class TestPageCache:
+
+    def test_links_are_not_shared_between_hosts(
+        self, settings, api_client, author, make_recipes
+    ):
+        settings.ALLOWED_HOSTS = ['first.ru', 'second.ru']
+        make_recipes(author, 3)
+        for host in ('first.ru', 'second.ru'):
+            response = api_client.get(
+                '/api/recipes/?limit=2', HTTP_HOST=host
+            )
+            assert response.data['next'].startswith(f'http://{host}/')
+
+
+@pytest.mark.django_db
+class TestRecipeListVersion:
+
+    def save_changes_version(self, capture, save):
+        version, = get_versions(['recipe_list'])
+        with capture(execute=True):
+            save()
+        return get_versions(['recipe_list']) != [version]
+
+    def test_users_without_recipes_keep_version(
+        self, user, make_user, django_capture_on_commit_callbacks
+    ):
+        capture = django_capture_on_commit_callbacks
+        assert not self.save_changes_version(
+            capture, lambda: make_user('newcomer')
+        )
+        user.set_password('Pass-54321')
+        assert not self.save_changes_version(capture, user.save)
+
+    def test_author_name_change_bumps_version(
+        self, author, make_recipes, django_capture_on_commit_callbacks
+    ):
+        make_recipes(author, 1)
+        author.first_name = 'Новое имя'
+        assert self.save_changes_version(
+            django_capture_on_commit_callbacks,
+            lambda: author.save(update_fields=['first_name'])
+        )
+
+
+@pytest.mark.django_db
+class TestIngredientIndex:
+
+    def test_rebuilt_when_version_changes(self, api_client, ingredients):
+        url = '/api/ingredients/?name=ингредиент 1'
+        assert api_client.get(url).data[0]['name'] == 'Ингредиент 1'
+        # Изменение в другом процессе: сигналы этого процесса
+        # не срабатывают, меняется только версия в общем кэше.
+        Ingredient.objects.filter(pk=ingredients[1].pk).update(
+            name='Ингредиент 1 новый'
+        )
+        bump_versions('ingredients')
+        response = api_client.get(url)
+        assert response.data[0]['name'] == 'Ингредиент 1 новый'
@@ -0,0 +1,286 @@
+import os
+import time
+
+import pytest
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.serializers import RecipeCreateUpdateSerializer
+from recipes import images
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.storage import ContentAddressedStorage
+
+
+@pytest.mark.django_db
+class TestRecipeList:
+
+    @pytest.mark.parametrize('client_name', ('api_client', 'user_client'))
+    def test_query_count_does_not_depend_on_page_size(
+        self, request, client_name, author, make_recipes, count_queries
+    ):
+        client = request.getfixturevalue(client_name)
+        make_recipes(author, 12)
+        assert (
+            count_queries(client, '/api/recipes/?limit=2')
+            == count_queries(client, '/api/recipes/?limit=12')
+        )
+
+    def test_query_count(
+        self, user, user_client, author, make_recipes,
+        django_assert_num_queries
+    ):
+        recipes = make_recipes(author, 6)
+        Favorite.objects.create(user=user, recipe=recipes[0])
+        ShoppingCart.objects.create(user=user, recipe=recipes[1])
+        # COUNT, рецепты с авторами, теги, ингредиенты,
+        # избранное и список покупок пользователя.
+        with django_assert_num_queries(6):
+            response = user_client.get('/api/recipes/?limit=6')
+        flags = {
+            recipe['id']: (
+                recipe['is_favorited'], recipe['is_in_shopping_cart']
+            )
+            for recipe in response.data['results']
+        }
+        assert flags[recipes[0].id] == (True, False)
+        assert flags[recipes[1].id] == (False, True)
+
+    def test_retrieve_query_count_does_not_depend_on_ingredients(
+        self, user_client, author, make_recipes, ingredients, count_queries
+    ):
+        short, long = make_recipes(author, 2)
+        long.recipeingredient_set.all().delete()
+        long.ingredients.add(
+            *ingredients, through_defaults={'amount': 1}
+        )
+        assert (
+            count_queries(user_client, f'/api/recipes/{short.id}/')
+            == count_queries(user_client, f'/api/recipes/{long.id}/')
+        )
+
+
+@pytest.mark.django_db
+class TestTagsFilter:
+
+    def ids(self, client, query):
+        response = client.get(f'/api/recipes/?limit=10&{query}')
+        assert response.status_code == 200
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_any_and_all_modes(self, api_client, author, make_recipes):
+        # Четные рецепты: breakfast и lunch, нечетные: lunch и dinner.
+        recipes = make_recipes(author, 4)
+        assert sorted(
+            self.ids(api_client, 'tags=lunch&tags=dinner')
+        ) == sorted(recipe.id for recipe in recipes)
+        assert sorted(
+            self.ids(api_client, 'tags=lunch&tags=dinner&tags_mode=all')
+        ) == sorted(recipe.id for recipe in recipes[1::2])
+        assert self.ids(api_client, 'tags=unknown') == []
+
+    def test_filter_does_not_add_queries(
+        self, api_client, author, make_recipes, django_assert_num_queries
+    ):
+        make_recipes(author, 4)
+        # COUNT, рецепты с авторами, теги, ингредиенты; словарь слагов
+        # читается только при первом запросе, дальше он в кэше.
+        with django_assert_num_queries(5):
+            api_client.get('/api/recipes/?tags=breakfast')
+        for query in (
+            'tags=lunch&tags=dinner', 'tags=lunch&tags=dinner&tags_mode=all'
+        ):
+            with django_assert_num_queries(4):
+                api_client.get(f'/api/recipes/?{query}')
+
+
+@pytest.mark.django_db
+class TestRecipeUpdate:
+
+    def update(self, client, recipe, amounts, tags, image):
+        """PATCH рецепта с ингредиентами {ingredient: количество};
+        возвращает число запросов к базе при холодных кэшах. """
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        with CaptureQueriesContext(connection) as context:
+            response = client.patch(
+                f'/api/recipes/{recipe.id}/',
+                {
+                    'name': recipe.name,
+                    'text': recipe.text,
+                    'cooking_time': recipe.cooking_time,
+                    'image': image,
+                    'tags': [tag.id for tag in tags],
+                    'ingredients': [
+                        {'id': ingredient.id, 'amount': amount}
+                        for ingredient, amount in amounts.items()
+                    ],
+                },
+                format='json'
+            )
+        assert response.status_code == 200, response.data
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_depend_on_ingredients(
+        self, author, author_client, make_recipes, ingredients, tags, image
+    ):
+        small, large = make_recipes(author, 2)
+        # small: 0, 1, 2 -> 0 без изменений, 1 изменен, 2 удален, 5 добавлен;
+        # large: 1, 2, 3 -> 1 без изменений, 2 изменен, 3 удален,
+        # 4-9 добавлены.
+        small_queries = self.update(author_client, small, {
+            ingredients[0]: 1, ingredients[1]: 9, ingredients[5]: 1,
+        }, tags, image)
+        large_queries = self.update(author_client, large, {
+            ingredients[1]: 1, ingredients[2]: 9,
+            **{ingredient: 1 for ingredient in ingredients[4:]},
+        }, tags, image)
+        assert small_queries == large_queries
+
+    def test_unchanged_rows_are_kept(
+        self, author, author_client, make_recipes, ingredients, tags, image
+    ):
+        recipe, = make_recipes(author, 1)
+        before = dict(recipe.recipeingredient_set.values_list(
+            'ingredient_id', 'pk'
+        ))
+        self.update(author_client, recipe, {
+            ingredients[0]: 1, ingredients[1]: 9, ingredients[5]: 1,
+        }, tags[:1], image)
+        after = dict(recipe.recipeingredient_set.values_list(
+            'ingredient_id', 'pk'
+        ))
+        assert after[ingredients[0].id] == before[ingredients[0].id]
+        assert after[ingredients[1].id] == before[ingredients[1].id]
+        assert set(after) == {
+            ingredients[0].id, ingredients[1].id, ingredients[5].id
+        }
+        assert list(recipe.tags.all()) == tags[:1]
+
+    def test_update_keeps_counters(
+        self, rf, user_client, author, make_recipes, ingredients, tags,
+        image
+    ):
+        recipe, = make_recipes(author, 1)
+        stale = Recipe.objects.get(pk=recipe.pk)
+        user_client.post(f'/api/recipes/{recipe.id}/favorite/')
+        user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        Recipe.objects.filter(pk=recipe.pk).update(trending_score=2.5)
+        request = rf.patch('/')
+        request.user = author
+        serializer = RecipeCreateUpdateSerializer(
+            stale,
+            data={
+                'name': 'Новое название',
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'image': image,
+                'tags': [tags[0].id],
+                'ingredients': [{'id': ingredients[0].id, 'amount': 5}],
+            },
+            context={'request': request}
+        )
+        assert serializer.is_valid(), serializer.errors
+        serializer.save()
+        recipe.refresh_from_db()
+        assert recipe.name == 'Новое название'
+        assert (
+            recipe.favorites_count, recipe.in_carts_count,
+            recipe.trending_score
+        ) == (1, 1, 2.5)
+
+    def test_unknown_tag(
+        self, author, author_client, make_recipes, ingredients, image
+    ):
+        recipe, = make_recipes(author, 1)
+        response = author_client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'image': image,
+                'tags': [999],
+                'ingredients': [{'id': ingredients[0].id, 'amount': 1}],
+            },
+            format='json'
+        )
+        assert response.status_code == 400
+        assert 'tags' in response.data
+
+
+@pytest.mark.django_db
+class TestImageRenditions:
+
+    @pytest.fixture
+    def scheduled(self, monkeypatch):
+        names = []
+        monkeypatch.setattr(images, 'submit', names.append)
+        return names
+
+    def test_model_image_change_drops_renditions(
+        self, api_client, author, make_recipes, scheduled,
+        django_capture_on_commit_callbacks
+    ):
+        recipe, = make_recipes(author, 1)
+        Recipe.objects.filter(pk=recipe.pk).update(image_processed=True)
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        with django_capture_on_commit_callbacks(execute=True):
+            recipe.name = 'Новое название'
+            recipe.save()
+        assert scheduled == []
+        with django_capture_on_commit_callbacks(execute=True):
+            recipe.image = 'recipes/images/other.png'
+            recipe.save()
+        assert scheduled == ['recipes/images/other.png']
+        recipe.refresh_from_db()
+        assert recipe.image_processed is False
+        response = api_client.get(f'/api/recipes/{recipe.id}/')
+        assert 'renditions' not in response.data['image']
+
+
+class TestContentAddressedStorage:
+
+    def test_reuse_refreshes_modified_time(self):
+        storage = ContentAddressedStorage()
+        name = storage.save('recipes/images/a.png', ContentFile(b'image'))
+        os.utime(storage.path(name), (0, 0))
+        assert storage.save(
+            'recipes/images/b.png', ContentFile(b'image')
+        ) == name
+        assert os.path.getmtime(storage.path(name)) > time.time() - 60
+
+
+@pytest.mark.django_db
+class TestSparseFields:
+
+    @pytest.mark.parametrize('client_name', ('api_client', 'user_client'))
+    def test_fields_without_id(
+        self, request, client_name, user, author, make_recipes
+    ):
+        client = request.getfixturevalue(client_name)
+        recipes = make_recipes(author, 2)
+        Favorite.objects.create(user=user, recipe=recipes[1])
+        response = client.get('/api/recipes/?fields=name,is_favorited')
+        assert response.status_code == 200
+        assert response.data['results'] == [
+            {
+                'name': recipe.name,
+                'is_favorited': (
+                    client_name == 'user_client' and recipe == recipes[1]
+                ),
+            }
+            for recipe in reversed(recipes)
+        ]
+
+    def test_retrieve_without_id(self, user_client, author, make_recipes):
+        recipe, = make_recipes(author, 1)
+        response = user_client.get(f'/api/recipes/{recipe.id}/?fields=name')
+        assert response.status_code == 200
+        assert response.data == {'name': recipe.name}
+
+    def test_unknown_field(self, api_client):
+        response = api_client.get('/api/recipes/?fields=name,secret')
+        assert response.status_code == 400
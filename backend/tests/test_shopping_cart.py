@@ -0,0 +1,222 @@
+import json
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api import serializers, views
+from foodgram import cache_versions
+from foodgram.cache_versions import bump_versions
+from recipes import models
+from recipes.models import Favorite, ShoppingCart, ShoppingListItem
+
+URL = '/api/recipes/download_shopping_cart/'
+
+LISTS = ['favorite', 'shopping_cart']
+
+
+def download(client, export_format):
+    """Скачивание списка покупок и число запросов к базе,
+    включая выполненные во время потоковой отдачи. """
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(URL, {'format': export_format})
+        content = b''.join(response.streaming_content).decode()
+    assert response.status_code == 200
+    return content, len(context.captured_queries)
+
+
+@pytest.mark.django_db
+class TestDownloadShoppingCart:
+
+    def add_to_cart(self, client, recipes):
+        for recipe in recipes:
+            response = client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+            assert response.status_code == 201
+
+    def test_query_count_does_not_depend_on_cart(
+        self, user_client, author, make_recipes
+    ):
+        recipes = make_recipes(author, 6)
+        self.add_to_cart(user_client, recipes[:1])
+        _, queries = download(user_client, 'txt')
+        self.add_to_cart(user_client, recipes[1:])
+        _, more_queries = download(user_client, 'txt')
+        assert more_queries == queries
+
+    def test_amounts_are_summed(
+        self, user_client, author, make_recipes, ingredients
+    ):
+        self.add_to_cart(user_client, make_recipes(author, 2))
+        content, _ = download(user_client, 'json')
+        amounts = {
+            item['name']: item['amount'] for item in json.loads(content)
+        }
+        # Рецепт 0: ингредиенты 0, 1, 2 по 1, 2, 3;
+        # рецепт 1: ингредиенты 1, 2, 3 по 1, 2, 3.
+        assert amounts == {
+            ingredients[0].name: 1,
+            ingredients[1].name: 3,
+            ingredients[2].name: 5,
+            ingredients[3].name: 3,
+        }
+
+
+@pytest.mark.django_db
+class TestShoppingListSync:
+
+    def shopping_list(self, user):
+        return dict(ShoppingListItem.objects.filter(
+            user=user
+        ).values_list('ingredient_id', 'amount'))
+
+    def test_recipe_update_changes_shopping_lists(
+        self, user, user_client, author, author_client, make_recipes,
+        ingredients, tags, image
+    ):
+        recipe, = make_recipes(author, 1)
+        user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        response = author_client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'image': image,
+                'tags': [tags[0].id],
+                'ingredients': [
+                    {'id': ingredients[0].id, 'amount': 5},
+                    {'id': ingredients[5].id, 'amount': 2},
+                ],
+            },
+            format='json'
+        )
+        assert response.status_code == 200, response.data
+        assert self.shopping_list(user) == {
+            ingredients[0].id: 5, ingredients[5].id: 2
+        }
+
+    def test_recipe_delete_changes_shopping_lists(
+        self, user, user_client, author, author_client, make_recipes
+    ):
+        first, second = make_recipes(author, 2)
+        for recipe in (first, second):
+            user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        response = author_client.delete(f'/api/recipes/{first.id}/')
+        assert response.status_code == 204
+        assert self.shopping_list(user) == dict(
+            second.recipeingredient_set.values_list('ingredient_id', 'amount')
+        )
+
+
+@pytest.mark.django_db
+class TestBulkChanges:
+
+    @pytest.fixture
+    def bumped(self, monkeypatch):
+        keys = []
+
+        def record(*bumped_keys):
+            keys.extend(bumped_keys)
+            bump_versions(*bumped_keys)
+
+        monkeypatch.setattr(cache_versions, 'bump_versions', record)
+        return keys
+
+    @pytest.mark.parametrize('name', LISTS)
+    def test_user_state_bumped_once(
+        self, name, user, user_client, author, make_recipes, bumped,
+        django_capture_on_commit_callbacks
+    ):
+        ids = [recipe.id for recipe in make_recipes(author, 4)]
+        key = f'user_state:{user.id}'
+        bulk_url = f'/api/recipes/{name}/'
+        url = f'/api/recipes/{ids[0]}/{name}/'
+        requests = (
+            (user_client.post, bulk_url, {'recipes': ids[1:]}),
+            (user_client.delete, bulk_url, {'recipes': ids[1:]}),
+            (user_client.post, url, None),
+            (user_client.delete, url, None),
+        )
+        for method, path, data in requests:
+            bumped.clear()
+            with django_capture_on_commit_callbacks(execute=True):
+                response = method(path, data, format='json')
+            assert response.status_code in (201, 204), path
+            assert bumped.count(key) == 1
+
+    @pytest.mark.parametrize('name, model', [
+        ('favorite', Favorite), ('shopping_cart', ShoppingCart)
+    ])
+    def test_remove_is_single_delete(
+        self, name, model, user_client, author, make_recipes
+    ):
+        url = f'/api/recipes/{name}/'
+        ids = [recipe.id for recipe in make_recipes(author, 6)]
+        user_client.post(url, {'recipes': ids}, format='json')
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.delete(url, {'recipes': ids}, format='json')
+        assert response.status_code == 204
+        table = model._meta.db_table
+        statements = [
+            query['sql'].split()[0] for query in context.captured_queries
+            if table in query['sql']
+        ]
+        # Отбор уже добавленных рецептов и одно удаление.
+        assert statements == ['SELECT', 'DELETE']
+
+
+@pytest.mark.django_db
+class TestLockOrder:
+    """Рецепты блокируются раньше пользователей во всех путях,
+    меняющих списки покупок. """
+
+    @pytest.fixture
+    def locks(self, monkeypatch):
+        calls = []
+
+        def recording(name, lock):
+            def record(ids):
+                calls.append((name, sorted(ids)))
+                return lock(ids)
+            return record
+
+        for module in (views, serializers, models):
+            for name in ('lock_recipes', 'lock_users'):
+                if hasattr(module, name):
+                    monkeypatch.setattr(module, name, recording(
+                        name, getattr(models, name)
+                    ))
+        return calls
+
+    def test_cart_add_locks_recipe_first(
+        self, user, user_client, author, make_recipes, locks
+    ):
+        recipe, = make_recipes(author, 1)
+        user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        assert locks[0] == ('lock_recipes', [recipe.id])
+        assert ('lock_users', [user.id]) in locks
+        assert ('lock_recipes', [recipe.id]) not in locks[1:]
+
+    def test_recipe_update_locks_recipe_before_reading_carts(
+        self, user, user_client, author, author_client, make_recipes,
+        ingredients, tags, image, locks
+    ):
+        recipe, = make_recipes(author, 1)
+        user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        locks.clear()
+        response = author_client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'image': image,
+                'tags': [tags[0].id],
+                'ingredients': [{'id': ingredients[0].id, 'amount': 5}],
+            },
+            format='json'
+        )
+        assert response.status_code == 200, response.data
+        assert locks[0] == ('lock_recipes', [recipe.id])
+        assert ('lock_users', [user.id]) in locks
+        assert ('lock_recipes', [recipe.id]) not in locks[1:]
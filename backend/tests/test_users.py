@@ -0,0 +1,90 @@
+import pytest
+from django.db.models import F
+
+from users.models import CustomUser, Follow
+
+
+@pytest.mark.django_db
+class TestSubscriptions:
+
+    def test_query_count_does_not_depend_on_authors(
+        self, user, user_client, make_user, make_recipes, count_queries
+    ):
+        def subscribe(count):
+            for number in range(count):
+                author = make_user(f'author{Follow.objects.count()}')
+                make_recipes(author, 3)
+                Follow.objects.create(user=user, author=author)
+
+        url = '/api/users/subscriptions/?limit=10&recipes_limit=2'
+        subscribe(1)
+        queries = count_queries(user_client, url)
+        subscribe(9)
+        assert count_queries(user_client, url) == queries
+
+    def test_recipes_limit(self, user, user_client, author, make_recipes):
+        recipes = make_recipes(author, 3)
+        Follow.objects.create(user=user, author=author)
+        response = user_client.get(
+            '/api/users/subscriptions/?recipes_limit=2'
+        )
+        assert response.status_code == 200
+        subscription, = response.data['results']
+        assert subscription['is_subscribed'] is True
+        assert subscription['recipes_count'] == 3
+        assert [recipe['id'] for recipe in subscription['recipes']] == [
+            recipes[2].id, recipes[1].id
+        ]
+
+
+@pytest.mark.django_db
+class TestCounters:
+
+    def test_user_save_keeps_followers_count(self, user, author):
+        stale = CustomUser.objects.get(pk=author.pk)
+        Follow.objects.create(user=user, author=author)
+        CustomUser.objects.filter(pk=author.pk).update(
+            followers_count=F('followers_count') + 1
+        )
+        stale.first_name = 'Новое имя'
+        stale.save()
+        author.refresh_from_db()
+        assert author.first_name == 'Новое имя'
+        assert author.followers_count == 1
+
+    def test_set_password_keeps_followers_count(
+        self, user_client, author, author_client
+    ):
+        response = user_client.post(f'/api/users/{author.id}/subscribe/')
+        assert response.status_code == 201
+        response = author_client.post(
+            '/api/users/set_password/',
+            {'current_password': 'Pass-12345', 'new_password': 'Pass-54321'}
+        )
+        assert response.status_code == 204
+        author.refresh_from_db()
+        assert author.followers_count == 1
+        assert author.check_password('Pass-54321')
+
+
+@pytest.mark.django_db
+class TestUserList:
+
+    def test_is_subscribed_query_count_does_not_depend_on_users(
+        self, user, user_client, make_user, count_queries
+    ):
+        url = '/api/users/?limit=10'
+        Follow.objects.create(user=user, author=make_user('author0'))
+        queries = count_queries(user_client, url)
+        for number in range(1, 8):
+            author = make_user(f'author{number}')
+            if number % 2:
+                Follow.objects.create(user=user, author=author)
+        assert count_queries(user_client, url) == queries
+        response = user_client.get(url)
+        subscribed = {
+            item['username'] for item in response.data['results']
+            if item['is_subscribed']
+        }
+        assert subscribed == {'author0', 'author1', 'author3', 'author5',
+                              'author7'}
@@ -13,6 +13,8 @@ class UserAdmin(UserAdmin):
         'first_name',
         'last_name',
         'email',
+        'recipes_count',
+        'followers_count',
     )
     list_filter = ('username', 'email',)
     search_fields = ('username', 'email',)
@@ -2,7 +2,34 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 
-class CustomUser(AbstractUser):
+class DenormalizedFieldsMixin:
+    """Поля denormalized_fields ведутся запросами update()
+    с F-выражениями, а значения в памяти экземпляра могут устареть.
+    Поэтому save() существующего объекта их не записывает, если они
+    не переданы в update_fields явно.
+    """
+
+    denormalized_fields = ()
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        if update_fields is None and not force_insert and not (
+            self._state.adding
+        ):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in self.denormalized_fields
+            ]
+        super().save(
+            force_insert=force_insert, force_update=force_update,
+            using=using, update_fields=update_fields
+        )
+
+
+class CustomUser(DenormalizedFieldsMixin, AbstractUser):
     "Кастомная модель пользователя."
 
     id = models.AutoField(primary_key=True)
@@ -13,6 +40,18 @@ class CustomUser(AbstractUser):
         unique=True,
         max_length=254
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False
+    )
+
+    denormalized_fields = ('recipes_count', 'followers_count')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name', 'password']